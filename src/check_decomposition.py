@@ -0,0 +1,87 @@
+"""
+Check the NumPy implementations of DIRINT and DIRINDEX against pvlib, and measure the speedup.
+
+This is done in three steps:
+1. Get the irradiance, solar position, and clear sky irradiance of each KNMI data set
+2. For each model
+    a. Calculate the DNI with pvlib and with the NumPy implementation
+    b. Check that both results are the same within the tolerance
+3. Print the largest difference and the speedup of each model and data set
+"""
+
+import time
+
+import numpy as np
+
+import utils
+
+DATASETS = ('../input/knmi_raw.csv', '../input/knmi_raw2.csv')
+MODELS = ('dirint', 'dirindex')
+REPEATS = 3
+
+# The tolerance (in W/m2), both implementations only differ by floating point rounding
+TOLERANCE = 1e-6
+
+
+def measure_duration(function):
+    """
+    Measure the shortest duration of a function over a number of repeats.
+
+    Parameters:
+        function (function): Function without arguments
+
+    Returns:
+        obj: Object with the 'result' of the function and its 'duration' (in seconds)
+    """
+    durations = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return {'result': result, 'duration': min(durations)}
+
+
+def check_model(model, irradiance, solar, *, latitude, longitude):
+    """
+    Calculate the DNI of a model with pvlib and the NumPy implementation and compare the results.
+
+    Parameters:
+        model (string): The name of the model, has to be either 'dirint' or 'dirindex'
+        irradiance (DataFrame): DataFrame with all weather and irradiance data
+        solar (SolarContext): Solar context of the irradiance data
+        latitude (float): Latitude
+        longitude (float): Longitude
+
+    Returns:
+        obj: Object with the largest difference ('max_error') and the 'speedup'
+    """
+    # Calculate the clear sky irradiance before timing, so it is not part of either duration
+    solar.clearsky
+
+    measurements = {
+        fast: measure_duration(lambda: utils.pv.calculate_dni(
+            model, irradiance, latitude=latitude, longitude=longitude, solar=solar, fast=fast))
+        for fast in (False, True)
+    }
+    expected = measurements[False]['result'].to_numpy()
+    actual = measurements[True]['result'].to_numpy()
+
+    if not np.allclose(actual, expected, rtol=0, atol=TOLERANCE, equal_nan=True):
+        raise Exception(f'The {model.upper()} DNI is not the same as the DNI of pvlib')
+
+    return {
+        'max_error': np.nanmax(np.abs(actual - expected)),
+        'speedup': measurements[False]['duration'] / measurements[True]['duration'],
+    }
+
+
+for filepath in DATASETS:
+    weather = utils.knmi.read_knmi_file(filepath)
+    irradiance = utils.pv.calculate_solar_position(
+        weather, latitude=utils.knmi.LATITUDE, longitude=utils.knmi.LONGITUDE, temp_col='temp')
+    solar = utils.solar.SolarContext(irradiance, latitude=utils.knmi.LATITUDE, longitude=utils.knmi.LONGITUDE)
+
+    for model in MODELS:
+        check = check_model(model, irradiance, solar, latitude=utils.knmi.LATITUDE, longitude=utils.knmi.LONGITUDE)
+        print(f'{filepath} {model.upper()} ({len(irradiance)} rows): max. error {check["max_error"]:.2e} W/m2, '
+              f'{check["speedup"]:.1f}x faster')
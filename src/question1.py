@@ -10,8 +10,16 @@ This is done in three steps:
     a. Measured DNI vs. Calculated DNI
     b. Solar elevation vs. DNI error
     c. Histogram of the DNI error
+
+With the --chunked argument the file is processed in blocks, so the memory does not depend on the
+length of the dataset. The errors and the histogram are then accumulated per block, and the scatter
+plots, which need all timesteps, are not created.
 """
 
+import sys
+
+import numpy as np
+
 import utils
 
 # Define the location and the models to use
@@ -19,6 +27,10 @@ LATITUDE = 52.08746136865645
 LONGITUDE = 5.168080610130638
 MODELS = ('disc', 'dirint', 'dirindex', 'erbs')
 
+# The number of rows per block in chunked mode (one week of minute data) and the bins of the error histogram
+BLOCK_SIZE = 7 * 24 * 60
+HISTOGRAM_BINS = np.linspace(-1000, 1000, 101)
+
 
 def create_measured_vs_calculated_scatterplot(irradiance):
     """
@@ -101,19 +113,56 @@ def create_histogram(irradiance):
     utils.plots.savefig('../output/question1/histogram.png')
 
 
-# Get the irradiance and position of the sun
-irradiance = utils.pv.get_irradiance(
-    '../input/upot.csv', latitude=LATITUDE, longitude=LONGITUDE, temp_col='temp_air')
+def create_histogram_from_accumulators(accumulators):
+    """
+    Create a histogram of the deviation from the accumulated histograms of the chunked mode.
+
+    Parameters:
+        accumulators (obj): Object with an ErrorAccumulator per model
+    """
+    colors = ('#915a8d', '#91723c', '#85ab7b', '#aa3026')
+    figure, axes = utils.plots.create_plot_with_subplots(
+        2, 2, xlabel='DNI error [$W/m^2$]', ylabel='Occurrances [#]')
+
+    for index, model in enumerate(MODELS):
+        subplot = axes[index // 2][index % 2]
+        accumulator = accumulators[model]
+
+        # Each bin is drawn with its count as weight
+        subplot.hist(accumulator.bins[:-1], bins=accumulator.bins, weights=accumulator.histogram,
+                     log=True, color=colors[index])
+        subplot.title.set_text(model.upper())
+    utils.plots.savefig('../output/question1/histogram.png')
 
-# Calculate the different DNI's
-for model in MODELS:
-    irradiance[f'dni_{model}'] = utils.pv.calculate_dni(
-        model, irradiance, latitude=LATITUDE, longitude=LONGITUDE)
-    errors = utils.misc.compare_series(
-        irradiance.DNI, irradiance[f'dni_{model}'])
-    utils.misc.print_object(errors, name=model, uppercase=True)
 
-# Create the plots
-create_measured_vs_calculated_scatterplot(irradiance)
-create_elevation_vs_error_scatterplot(irradiance)
-create_histogram(irradiance)
+if '--chunked' in sys.argv:
+    # Calculate the different DNI's block by block, and only keep the accumulated errors
+    accumulators = {model: utils.misc.ErrorAccumulator(HISTOGRAM_BINS) for model in MODELS}
+    irradiance_blocks = utils.pv.read_irradiance_blocks(
+        '../input/upot.csv', latitude=LATITUDE, longitude=LONGITUDE, temp_col='temp_air', block_size=BLOCK_SIZE)
+    for irradiance in utils.pv.calculate_dni_blocks(
+            MODELS, irradiance_blocks, latitude=LATITUDE, longitude=LONGITUDE):
+        for model in MODELS:
+            accumulators[model].update(irradiance.DNI, irradiance[f'dni_{model}'])
+
+    for model in MODELS:
+        utils.misc.print_object(accumulators[model].get_errors(), name=model, uppercase=True)
+    create_histogram_from_accumulators(accumulators)
+else:
+    # Get the irradiance and position of the sun
+    irradiance = utils.pv.get_irradiance(
+        '../input/upot.csv', latitude=LATITUDE, longitude=LONGITUDE, temp_col='temp_air')
+    solar = utils.solar.SolarContext(irradiance, latitude=LATITUDE, longitude=LONGITUDE)
+
+    # Calculate the different DNI's
+    for model in MODELS:
+        irradiance[f'dni_{model}'] = utils.pv.calculate_dni(
+            model, irradiance, latitude=LATITUDE, longitude=LONGITUDE, solar=solar)
+        errors = utils.misc.compare_series(
+            irradiance.DNI, irradiance[f'dni_{model}'])
+        utils.misc.print_object(errors, name=model, uppercase=True)
+
+    # Create the plots
+    create_measured_vs_calculated_scatterplot(irradiance)
+    create_elevation_vs_error_scatterplot(irradiance)
+    create_histogram(irradiance)
@@ -19,10 +19,10 @@ The calculations for question 4 are already done during question3, so only the f
 2. Create a bar chart for the specific annual AC yield
 3. Create a bar charter for the annual inverter efficiency
 3. Create a line chart for average hourly AC output for three different days
+5. Create a table with the interannual mean, spread, and P90 of the annual AC yield
 """
 
 import datetime
-import math
 
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
@@ -32,83 +32,66 @@ import utils
 
 COLORS = ['#aa3026', '#85ab7b', '#915a8d', '#91723c']
 
+# Raw KNMI files of the Leeuwarden station (270) with the weather years for the interannual yield table, the
+# raw files of other years of this station can be added for the spread and P90. knmi_raw2.csv is not used
+# because it is the same year at another station (283, Hupsel)
+WEATHER_YEARS = ['../input/knmi_raw.csv']
 
-def calculate_capacity(buildings):
+
+def calculate_capacity(facades):
     """
     Calculate the number of panels and total capacity of each facade per module type.
 
     Parameters:
-        buildings (obj): Original buildings object
+        facades (DataFrame): Table with a row per facade
 
     Returns:
-        obj: Buildings object with capacity and number of panels per facade and module type
-    """
-    buildings = buildings.copy()
-    for building in buildings.values():
-        for facade in building.values():
-            # Calculate the possible installation area
-            installation_area = facade['area'] * facade['coverage']
-
-            # Add the number of panels and the total possible max capacity for all three modules
-            for module_type, module in modules.items():
-                num_panels = math.floor(installation_area / module.get('Area'))
-                facade[module_type] = {
-                    'num_panels': num_panels,
-                    'capacity': num_panels * module.get('Wp') / 1000,
-                }
-    return buildings
-
-
-def calculate_power_output(buildings):
+        DataFrame: Results table with capacity and number of panels per facade and module type
     """
-    Calculate the DC and AC power output of each facade per module type.
+    return utils.facades.create_results_table(facades, modules)
 
-    Parameters:
-        buildings (obj): Original buildings object
 
-    Returns:
-        obj: Buildings object with annual yield per facade and module type
-    """
-    buildings = buildings.copy()
-    for building in buildings.values():
-        for facade in building.values():
-            # Add the number of panels and the total possible max capacity for all three modules
-            for module_type, module in modules.items():
-                power_info = utils.pv.calculate_power_output(
-                    irradiance, module, tilt=facade['tilt'], azimuth=facade['azimuth'])
-
-                # Calculate the annual yield and efficiency
-                num_panels = facade[module_type]['num_panels']
-                annual_yield_dc = num_panels * power_info['dc'].sum() / 1000
-                annual_yield_ac = num_panels * power_info['ac'].sum() / 1000
-                inverter_efficiency = annual_yield_ac / annual_yield_dc
-
-                # Add the annual yield and efficiency to the tab
-                facade[module_type].update({
-                    'total_annual_yield_dc': annual_yield_dc,
-                    'specific_annual_yield_dc': annual_yield_dc / (facade['area'] * facade['coverage']),
-                    'total_annual_yield_ac': annual_yield_ac,
-                    'specific_annual_yield_ac': annual_yield_ac / (facade['area'] * facade['coverage']),
-                    'annual_inverter_efficiency': inverter_efficiency,
-                })
-    return buildings
-
-
-def find_best_module(facade):
+def calculate_power_output(results):
     """
-    Find the best module for specific facade.
+    Calculate the DC and AC power output of each facade per module type.
 
     Parameters:
-        facade (obj): Data about the specific facade
+        results (DataFrame): Results table with the number of panels per facade and module type
 
     Returns:
-        str: Name of the best module
+        DataFrame: Results table with annual yield per facade and module type
     """
-    best_module = None
-    for module in modules:
-        if not best_module or facade[module]['total_annual_yield_dc'] > facade[best_module]['total_annual_yield_dc']:
-            best_module = module
-    return best_module
+    # Calculate the annual yield of a single panel once for each unique orientation, row spacing, and module
+    panel_yields = {}
+    layout_columns = ['tilt', 'azimuth', 'row_spacing']
+    layouts = facades[layout_columns].drop_duplicates()
+    for layout_id, (tilt, azimuth, row_spacing) in enumerate(layouts.itertuples(index=False)):
+        for module_type, module in modules.items():
+            power_info = utils.pv.calculate_power_output(
+                irradiance, module, tilt=tilt, azimuth=azimuth, solar=solar, row_spacing=row_spacing)
+            panel_yields[(layout_id, module_type)] = (power_info['dc'].sum() / 1000, power_info['ac'].sum() / 1000)
+    panel_yields = pd.DataFrame.from_dict(panel_yields, orient='index', columns=['dc', 'ac'])
+
+    # Look up the layout and installation area of the facade on each row of the results table, the facades
+    # without rows have a NaN row spacing, so the layouts are numbered in the same order as above
+    layout_ids = facades.groupby(layout_columns, dropna=False, sort=False).ngroup()
+    facade_rows = facades.loc[results.index.droplevel('module')]
+    installation_area = (facade_rows.area * facade_rows.coverage).to_numpy(dtype=float)
+    keys = list(zip(layout_ids.loc[results.index.droplevel('module')], results.index.get_level_values('module')))
+    panel_yield_dc = panel_yields.dc.loc[keys].to_numpy()
+    panel_yield_ac = panel_yields.ac.loc[keys].to_numpy()
+
+    # Calculate the annual yield and efficiency for all facades and modules at once
+    num_panels = results.num_panels.to_numpy()
+    annual_yield_dc = num_panels * panel_yield_dc
+    annual_yield_ac = num_panels * panel_yield_ac
+    return results.assign(
+        total_annual_yield_dc=annual_yield_dc,
+        specific_annual_yield_dc=annual_yield_dc / installation_area,
+        total_annual_yield_ac=annual_yield_ac,
+        specific_annual_yield_ac=annual_yield_ac / installation_area,
+        annual_inverter_efficiency=panel_yield_ac / panel_yield_dc,
+    )
 
 
 def create_bar_chart_for_all_modules(column, *, scale=1, filename, ylabel):
@@ -120,12 +103,8 @@ def create_bar_chart_for_all_modules(column, *, scale=1, filename, ylabel):
         filename (str): Name under which file should be saved
         ylabe (str): Name of the vertical axis
     """
-    facades_dataframe = pd.DataFrame(
-        {}, columns=modules.columns.to_series())
-    for building_name, building in buildings.items():
-        for facade_name, facade in building.items():
-            facades_dataframe.loc[f'{building_name} - {facade_name}'] = list(
-                map(lambda module_name: facade[module_name][column] * scale, modules))
+    facades_dataframe = utils.facades.unstack_modules(results, column, modules) * scale
+    facades_dataframe.index = utils.facades.get_labels(facades_dataframe.index)
 
     facades_dataframe.plot(kind='bar', ylabel=ylabel, color=COLORS)
     utils.plots.savefig(f'../output/question3/{filename}.png')
@@ -140,11 +119,8 @@ def create_bar_chart_for_best_module(column, *, scale=1, filename, ylabel):
         filename (str): Name under which file should be saved
         ylabe (str): Name of the vertical axis
     """
-    facades_dataframe = pd.Series([], dtype='float64')
-    for building_name, building in buildings.items():
-        for facade_name, facade in building.items():
-            best_module = find_best_module(facade)
-            facades_dataframe.loc[f'{building_name} - {facade_name}'] = facade[best_module][column] * scale
+    facades_dataframe = best_modules[column] * scale
+    facades_dataframe.index = utils.facades.get_labels(facades_dataframe.index)
 
     facades_dataframe.plot(kind='bar', ylabel=ylabel)
     utils.plots.savefig(f'../output/question3/{filename}.png')
@@ -152,20 +128,9 @@ def create_bar_chart_for_best_module(column, *, scale=1, filename, ylabel):
 
 def create_bar_chart_per_building():
     """
-    Create a bar chart with AC output per building.s
-
-    Parameters:
-        column (str): Name of column that should be plotted
-        filename (str): Name under which file should be saved
-        ylabe (str): Name of the vertical axis
+    Create a bar chart with AC output per building.
     """
-    buildings_dataframe = pd.Series([], dtype='float64')
-    for building_name, building in buildings.items():
-        annual_yield_building = 0
-        for facade_name, facade in building.items():
-            best_module = find_best_module(facade)
-            annual_yield_building += facade[best_module]['total_annual_yield_ac']
-        buildings_dataframe.loc[f'{building_name}'] = annual_yield_building / 1000
+    buildings_dataframe = best_modules.total_annual_yield_ac.groupby(level='building', sort=False).sum() / 1000
 
     buildings_dataframe.plot(
         kind='bar', ylabel='Total annual yield [$MWh_{ac} / year$]', color=COLORS[0])
@@ -191,7 +156,7 @@ def create_line_chart_for_day():
     fall_day = find_best_day('2019-10-01', '2019-11-30')
 
     dates = (spring_day, summer_day, fall_day)
-    for building_name, building in buildings.items():
+    for building_name, building in best_modules.groupby(level='building', sort=False):
         # Create a new chart for each building
         figure, axes = utils.plots.create_plot_with_subplots(len(
             dates), 1, xlabel='Time [hour]', ylabel='Average output [$kW_{ac}$]', sharex=False)
@@ -199,17 +164,16 @@ def create_line_chart_for_day():
         # Create a subplot for each day
         for index, date in enumerate(dates):
             power_per_facade = {}
+            irradiance_day = irradiance.loc[date]
             # Calculate the power output for each facade
-            for facade_name, facade in building.items():
-                # Save some variables
-                best_module = find_best_module(facade)
-                irradiance_day = irradiance.loc[date]
-
+            for (_, facade_name), facade in building.iterrows():
                 # Calculate the power output and save it in the power_outputs dictionary
+                tilt, azimuth, row_spacing = facades.loc[
+                    (building_name, facade_name), ['tilt', 'azimuth', 'row_spacing']]
                 ac_power = utils.pv.calculate_power_output(
-                    irradiance_day, modules[best_module], tilt=facade['tilt'], azimuth=facade['azimuth'])['ac']
-                power_per_facade[facade_name] = facade[best_module]['num_panels'] * \
-                    ac_power / 1000
+                    irradiance_day, modules[facade.module], tilt=tilt, azimuth=azimuth, solar=solar,
+                    row_spacing=row_spacing)['ac']
+                power_per_facade[facade_name] = facade.num_panels * ac_power / 1000
 
             # Create a subplot and plot a line for each subplot
             subplot = axes[index]
@@ -236,35 +200,53 @@ def create_table_pv_systems():
     """
     Create a LaTeX table with info about each facade.
     """
-    facades = pd.DataFrame({}, columns=[
-                           'Facade name', 'Best module', 'Total capacity', 'Tilt', 'Orientation'])
-    for building in buildings:
-        for facade_name in buildings[building]:
-            facade = buildings[building][facade_name]
-
-            # Add the facade info to the facades DataFrame
-            name = f'{building} - {facade_name}'
-            best_module = find_best_module(facade)
-            total_capacity = facade[best_module]['capacity']
-            tilt = facade['tilt']
-            orientation = facade['azimuth']
-            facades.loc[name] = [name, best_module,
-                                 total_capacity, tilt, orientation]
+    names = utils.facades.get_labels(best_modules.index)
+    table = pd.DataFrame({
+        'Facade name': names,
+        'Best module': best_modules.module.to_numpy(),
+        'Total capacity': best_modules.capacity.to_numpy(),
+        'Tilt': facades.tilt.loc[best_modules.index].to_numpy(),
+        'Orientation': facades.azimuth.loc[best_modules.index].to_numpy(),
+    }, index=names)
 
     # Create a LaTeX table from the DataFrame
     utils.files.save_text_file(
-        facades.to_latex(), filepath='../output/question3/table_pv_systems.tex')
+        table.to_latex(), filepath='../output/question3/table_pv_systems.tex')
+
+
+def create_table_interannual_yield(filepaths):
+    """
+    Create a LaTeX table with the interannual mean, spread, and P90 of the annual AC yield of each facade.
+
+    The spread and P90 need at least two complete weather years, without them only the mean is filled in.
+
+    Parameters:
+        filepaths (list): Paths of the raw KNMI files with the weather years, all of the same station
+    """
+    weather_years = utils.ensemble.load_ensemble(filepaths)
+    if len(weather_years['members']) < 2:
+        print(f'The spread and P90 of the interannual yield need at least two complete weather years, '
+              f'found: {", ".join(weather_years["members"])}')
+
+    annual_yields = utils.ensemble.calculate_facade_yields(weather_years, facades, best_modules, modules)
+    summary = utils.ensemble.summarize_yields(annual_yields)[['mean_ac', 'std_ac', 'p90_ac']] / 1000
+    summary.index = utils.facades.get_labels(summary.index)
+    summary.columns = ['Mean [MWh]', 'Standard deviation [MWh]', 'P90 [MWh]']
+
+    utils.files.save_text_file(
+        summary.to_latex(float_format='%.1f', na_rep='-'), filepath='../output/question3/table_interannual_yield.tex')
 
 
 # Import data
-irradiance = utils.knmi.get_irradiance()
+irradiance, solar = utils.knmi.get_irradiance_with_solar_context()
 buildings = utils.files.open_json_file('../output/question2/buildings.json')
-modules = pd.read_excel(
-    '../input/Module parameters.xlsx', index_col='Parameters')
+facades = utils.facades.create_facade_table(buildings)
+modules = utils.modules.load_modules('../input/Module parameters.xlsx')
 
-# Calculate the capacity and power output per facade
-buildings = calculate_capacity(buildings)
-buildings = calculate_power_output(buildings)
+# Calculate the capacity and power output per facade and find the best module for each facade
+results = calculate_capacity(facades)
+results = calculate_power_output(results)
+best_modules = utils.facades.find_best_modules(results)
 
 # Create bar charts for the total and specific annual yield
 # create_bar_chart_for_all_modules(
@@ -282,7 +264,8 @@ create_bar_chart_for_all_modules(
     'annual_inverter_efficiency', filename='annual_inverter_efficiency', ylabel='Annual inverter efficiency')
 create_bar_chart_per_building()
 create_line_chart_for_day()
+create_table_interannual_yield(WEATHER_YEARS)
 
 # Save the buildings info in a new JSON file
 # utils.files.save_json_file(
-#     buildings, filepath='../output/question3/buildings.json')
+#     utils.facades.create_buildings_object(facades, results), filepath='../output/question3/buildings.json')
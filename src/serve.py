@@ -0,0 +1,24 @@
+"""
+Run the yield service, which keeps the KNMI weather data and module library in memory and answers yield queries.
+
+The service is started in two steps:
+1. Load the weather data, solar context, and module parameters once
+2. Answer requests until the process is stopped, for example:
+    a. /yield?tilt=30&azimuth=180&module=<module>&area=100 for the annual DC and AC yield
+    b. /yield?...&hourly=true for the power output of each timestep as well
+    c. /modules for the names of all modules
+    d. /status for the cache statistics
+"""
+
+import utils
+
+HOST = '127.0.0.1'
+PORT = 8765
+
+service = utils.service.load_service()
+server = utils.service.create_server(service, host=HOST, port=PORT)
+print(f'The yield service is running on http://{HOST}:{PORT}')
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    server.server_close()
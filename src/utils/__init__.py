@@ -1,3 +1,3 @@
-from utils import files, knmi, misc, plots, pv
+from utils import decomposition, ensemble, facades, files, grid, knmi, layout, misc, modules, plots, pv, service, solar, stream
 
-__all__ = ['files', 'knmi', 'misc', 'plots', 'pv']
+__all__ = ['decomposition', 'ensemble', 'facades', 'files', 'grid', 'knmi', 'layout', 'misc', 'modules', 'plots', 'pv', 'service', 'solar', 'stream']
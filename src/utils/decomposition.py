@@ -0,0 +1,226 @@
+import numpy as np
+import pandas as pd
+import pvlib
+
+# Upper bin edges of the DIRINT coefficient table, the last bin of each dimension is open ended
+KT_PRIME_BIN_EDGES = np.array([0.24, 0.4, 0.56, 0.7, 0.8])
+ZENITH_BIN_EDGES = np.array([25, 40, 55, 70, 80])
+DELTA_KT_PRIME_BIN_EDGES = np.array([0.015, 0.035, 0.07, 0.15, 0.3])
+
+# Without a dew point temperature the last of the five precipitable water bins is always used
+W_BIN = 4
+
+# The coefficient table has the shape (kt_prime, zenith, delta_kt_prime, w) = (6, 6, 7, 5), it is flattened
+# so a coefficient can be found with a single index
+DIRINT_COEFFICIENTS = np.append(pvlib.irradiance._get_dirint_coeffs().ravel(), np.nan)
+STRIDES = np.array([6 * 7 * 5, 7 * 5, 5])
+MISSING_COEFFICIENT = len(DIRINT_COEFFICIENTS) - 1
+
+
+def _to_array(values):
+    """
+    Convert a Series or list to a float NumPy array without copying when possible.
+    """
+    return np.asarray(values, dtype=float)
+
+
+def _get_extra_radiation(times):
+    """
+    Calculate the extraterrestrial irradiance with the Spencer method and a solar constant of 1370, as DISC does.
+
+    Parameters:
+        times (DatetimeIndex): Timestamps
+
+    Returns:
+        ndarray: Extraterrestrial irradiance for each timestamp
+    """
+    day_angle = (2 * np.pi / 365) * (times.dayofyear.to_numpy() - 1)
+    return 1370 * (1.00011 + 0.034221 * np.cos(day_angle) + 0.00128 * np.sin(day_angle) +
+                   0.000719 * np.cos(2 * day_angle) + 7.7e-05 * np.sin(2 * day_angle))
+
+
+def _get_airmass(solar_zenith):
+    """
+    Calculate the absolute airmass at sea level with the Kasten (1966) model, as DISC does.
+
+    Parameters:
+        solar_zenith (ndarray): Solar zenith angle (degrees)
+
+    Returns:
+        ndarray: Absolute airmass at sea level for each timestamp, NaN if the sun is below the horizon
+    """
+    zenith = np.where(solar_zenith > 90, np.nan, solar_zenith)
+    return 1 / (np.cos(np.radians(zenith)) + 0.15 * (93.885 - zenith) ** -1.253)
+
+
+def _prepare_geometry(solar_zenith, times, pressure, *, extra_radiation=None, airmass=None, min_cos_zenith=0.065):
+    """
+    Calculate everything DISC and DIRINT need that only depends on the solar position and time.
+
+    Parameters:
+        solar_zenith (ndarray): Solar zenith angle (degrees)
+        times (DatetimeIndex): Timestamps
+        pressure (float): Air pressure (Pa)
+        extra_radiation (ndarray): Extraterrestrial irradiance, see _get_extra_radiation (calculated if not given)
+        airmass (ndarray): Absolute airmass at sea level, see _get_airmass (calculated if not given)
+        min_cos_zenith (float): Smallest cosine of the zenith used for the clearness index
+
+    Returns:
+        obj: Object with the 'extra_radiation', horizontal extraterrestrial irradiance ('extra_radiation_horizontal'),
+            'airmass', 'kt_prime_factor', 'knc', and 'zenith_offset' (zenith bin index times its stride)
+    """
+    extra_radiation = _get_extra_radiation(times) if extra_radiation is None else _to_array(extra_radiation)
+    airmass = _get_airmass(solar_zenith) if airmass is None else _to_array(airmass)
+
+    # Convert the airmass to the air pressure and limit it to 12 like DISC does
+    airmass = np.minimum(airmass * pressure / 101325, 12)
+
+    # Precompute the zenith bin, zenith angles below 0 or unknown have no coefficient
+    zenith_bin = np.searchsorted(ZENITH_BIN_EDGES, solar_zenith, side='right')
+    zenith_offset = np.where(solar_zenith >= 0, zenith_bin * STRIDES[1], -1)
+
+    return {
+        'extra_radiation': extra_radiation,
+        'extra_radiation_horizontal': extra_radiation * np.maximum(np.cos(np.radians(solar_zenith)), min_cos_zenith),
+        'airmass': airmass,
+        'kt_prime_factor': 1.031 * np.exp(-1.4 / (0.9 + 9.4 / airmass)) + 0.1,
+        'knc': 0.866 + airmass * (-0.122 + airmass * (0.0121 + airmass * (-0.000653 + 1.4e-05 * airmass))),
+        'zenith_offset': zenith_offset,
+        'is_invalid_zenith': solar_zenith > 87,
+    }
+
+
+def _disc(ghi, geometry, kt):
+    """
+    Calculate the DNI with the DISC model and the clearness index, writing the clearness index into kt.
+
+    Parameters:
+        ghi (ndarray): Global horizontal irradiance
+        geometry (obj): Object created by _prepare_geometry
+        kt (ndarray): Preallocated array that is filled with the clearness index
+
+    Returns:
+        ndarray: The DNI
+    """
+    np.divide(ghi, geometry['extra_radiation_horizontal'], out=kt)
+    np.clip(kt, 0, 1, out=kt)
+
+    # Coefficients of Maxwell (1987), with different polynomials for cloudy (kt <= 0.6) and clear skies
+    is_cloudy = kt <= 0.6
+    a = np.where(is_cloudy, 0.512 + kt * (-1.56 + kt * (2.286 - 2.222 * kt)),
+                 -5.743 + kt * (21.77 + kt * (-27.49 + 11.56 * kt)))
+    b = np.where(is_cloudy, 0.37 + 0.962 * kt, 41.4 + kt * (-118.5 + kt * (66.05 + 31.9 * kt)))
+    c = np.where(is_cloudy, -0.28 + kt * (0.932 - 2.048 * kt),
+                 -47.01 + kt * (184.2 + kt * (-222.0 + 73.81 * kt)))
+
+    dni = (geometry['knc'] - (a + b * np.exp(c * geometry['airmass']))) * geometry['extra_radiation']
+    dni[geometry['is_invalid_zenith'] | (ghi < 0) | (dni < 0)] = 0
+    return dni
+
+
+def _dirint(ghi, geometry, kt_prime, segments=None):
+    """
+    Calculate the DNI with the DIRINT model, using kt_prime as workspace.
+
+    Parameters:
+        ghi (ndarray): Global horizontal irradiance
+        geometry (obj): Object created by _prepare_geometry
+        kt_prime (ndarray): Preallocated array that is filled with the zenith independent clearness index
+        segments (ndarray): Segment of each timestep, timesteps of different segments are not neighbours (optional)
+
+    Returns:
+        ndarray: The DNI
+    """
+    dni = _disc(ghi, geometry, kt_prime)
+    np.divide(kt_prime, geometry['kt_prime_factor'], out=kt_prime)
+    np.clip(kt_prime, 0, 1, out=kt_prime)
+
+    # The change in kt_prime is the mean of the absolute differences with the available neighbours
+    differences = np.full((2, len(kt_prime)), np.nan)
+    np.abs(kt_prime[1:] - kt_prime[:-1], out=differences[0, 1:])
+    if segments is not None:
+        differences[0, 1:][segments[1:] != segments[:-1]] = np.nan
+    differences[1, :-1] = differences[0, 1:]
+    is_available = ~np.isnan(differences)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta_kt_prime = np.where(is_available, differences, 0).sum(axis=0) / is_available.sum(axis=0)
+
+    # Look up the coefficient of each timestep with a single index in the flattened table
+    index = (np.searchsorted(KT_PRIME_BIN_EDGES, kt_prime, side='right') * STRIDES[0] + geometry['zenith_offset'] +
+             np.searchsorted(DELTA_KT_PRIME_BIN_EDGES, delta_kt_prime, side='right') * STRIDES[2] + W_BIN)
+    is_missing = np.isnan(kt_prime) | np.isnan(delta_kt_prime) | (geometry['zenith_offset'] < 0)
+    index[is_missing] = MISSING_COEFFICIENT
+
+    dni *= DIRINT_COEFFICIENTS[index]
+    return dni
+
+
+def _to_output(values, times):
+    """
+    Return the values as a Series if times is a DatetimeIndex, like pvlib does.
+    """
+    return pd.Series(values, index=times) if isinstance(times, pd.DatetimeIndex) else values
+
+
+def dirint(ghi, solar_zenith, times, *, pressure=101325., extra_radiation=None, airmass=None):
+    """
+    Calculate the DNI with the DIRINT model, with the same result as pvlib.irradiance.dirint without a dew point.
+
+    Parameters:
+        ghi (Series or ndarray): Global horizontal irradiance
+        solar_zenith (Series or ndarray): Solar zenith angle (degrees)
+        times (DatetimeIndex): Timestamps
+        pressure (float): Air pressure (Pa)
+        extra_radiation (Series or ndarray): Extraterrestrial irradiance, for example SolarContext.extra_radiation
+            (calculated if not given)
+        airmass (Series or ndarray): Absolute airmass at sea level, for example SolarContext.kasten_airmass
+            (calculated if not given)
+
+    Returns:
+        Series: The DNI
+    """
+    ghi = _to_array(ghi)
+    geometry = _prepare_geometry(
+        _to_array(solar_zenith), times, pressure, extra_radiation=extra_radiation, airmass=airmass)
+    return _to_output(_dirint(ghi, geometry, np.empty_like(ghi)), times)
+
+
+def dirindex(ghi, ghi_clear, dni_clear, solar_zenith, times, *, pressure=101325., extra_radiation=None,
+             airmass=None, segments=None):
+    """
+    Calculate the DNI with the DIRINDEX model, with the same result as pvlib.irradiance.dirindex without a dew point.
+
+    The geometry is shared between the DIRINT calculation of the measured and the clear sky GHI. Several
+    series can be calculated at once by concatenating them and giving the segment of each timestep, the
+    result is the same as calculating each segment on its own.
+
+    Parameters:
+        ghi (Series or ndarray): Global horizontal irradiance
+        ghi_clear (Series or ndarray): Clear sky global horizontal irradiance
+        dni_clear (Series or ndarray): Clear sky direct normal irradiance
+        solar_zenith (Series or ndarray): Solar zenith angle (degrees)
+        times (DatetimeIndex): Timestamps
+        pressure (float): Air pressure (Pa)
+        extra_radiation (Series or ndarray): Extraterrestrial irradiance, for example SolarContext.extra_radiation
+            (calculated if not given)
+        airmass (Series or ndarray): Absolute airmass at sea level, for example SolarContext.kasten_airmass
+            (calculated if not given)
+        segments (Series or ndarray): Segment of each timestep, such as the year of an ensemble member, the
+            first and last timestep of a segment do not use the next segment as neighbour (optional)
+
+    Returns:
+        Series: The DNI
+    """
+    ghi = _to_array(ghi)
+    geometry = _prepare_geometry(
+        _to_array(solar_zenith), times, pressure, extra_radiation=extra_radiation, airmass=airmass)
+    segments = None if segments is None else np.asarray(segments)
+    workspace = np.empty_like(ghi)
+
+    dni = _dirint(ghi, geometry, workspace, segments)
+    dni_clear_dirint = _dirint(_to_array(ghi_clear), geometry, workspace, segments)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dni *= _to_array(dni_clear)
+        dni /= dni_clear_dirint
+    dni[dni < 0] = 0
+    return _to_output(dni, times)
@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils import decomposition, knmi, pv
+from utils.solar import SolarContext
+
+TIMESTEPS_PER_YEAR = 365 * 24
+
+
+def _align_to_grid(weather):
+    """
+    Remove February 29 and add the position of each row on the day of year and hour grid as 'timestep'.
+    """
+    time = weather.index
+    weather = weather[~((time.month == 2) & (time.day == 29))]
+    time = weather.index
+    day = time.dayofyear - 1 - (time.is_leap_year & (time.month > 2))
+    return weather.assign(timestep=day * 24 + time.hour)
+
+
+def load_ensemble(filepaths):
+    """
+    Load several years of KNMI data of a single station and align them onto a common day of year and hour grid.
+
+    Each complete year in the files becomes a member of the ensemble. February 29 is removed, so every
+    member has the same 365 x 24 timesteps. Years that do not have a GHI for all timesteps are left out,
+    because their annual yield would be too low. The solar position is calculated with the coordinates of
+    the station in the header of the files. DIRINDEX is calculated for all members at once, with each
+    member as a separate segment, so the first and last timestep of a member do not use the member next
+    to it as neighbour.
+
+    Parameters:
+        filepaths (list): Paths of the raw KNMI files, all of the same station
+
+    Returns:
+        obj: Object with the 'station', the 'members' names, the 'incomplete' years that are left out, the
+            daytime 'irradiance' of all members with the 'member' and 'timestep' of each row, and its 'solar'
+            context
+    """
+    station = None
+    members = []
+    years = set()
+    incomplete = []
+    weather_years = []
+    for filepath in filepaths:
+        file_station = knmi.read_knmi_station(filepath)
+        if station is None:
+            station = file_station
+        elif file_station['station'] != station['station']:
+            raise Exception(f'{filepath} is from station {file_station["station"]} ({file_station["name"]}) '
+                            f'instead of station {station["station"]} ({station["name"]})')
+
+        weather = knmi.read_knmi_file(filepath)
+        for year, weather_year in weather.groupby(weather.index.year):
+            name = f'{os.path.basename(filepath)} {year}'
+            if year in years:
+                raise Exception(f'The year {year} is in more than one file')
+            years.add(year)
+
+            weather_year = _align_to_grid(weather_year)
+            if weather_year.timestep[weather_year.GHI.notna()].nunique() < TIMESTEPS_PER_YEAR:
+                incomplete.append(name)
+                continue
+
+            members.append(name)
+            weather_years.append(weather_year.assign(member=len(members) - 1))
+
+    if not members:
+        raise Exception('None of the years in the KNMI files is complete')
+    weather = pd.concat(weather_years)
+
+    # Calculate the solar position, DNI, and DHI for all members at once
+    latitude = station['latitude']
+    longitude = station['longitude']
+    irradiance = pv.calculate_solar_position(weather, latitude=latitude, longitude=longitude, temp_col='temp')
+    solar = SolarContext(irradiance, latitude=latitude, longitude=longitude)
+    irradiance['DNI'] = decomposition.dirindex(
+        irradiance.GHI, solar.clearsky['ghi'], solar.clearsky['dni'], irradiance.solar_zenith, irradiance.index,
+        extra_radiation=solar.extra_radiation, airmass=solar.kasten_airmass, segments=irradiance.member)
+    irradiance['DHI'] = irradiance.GHI - irradiance.DNI * solar.cos_zenith
+
+    return {'station': station, 'members': members, 'incomplete': incomplete, 'irradiance': irradiance, 'solar': solar}
+
+
+def stack(ensemble, values, *, fill_value=0):
+    """
+    Stack the values of all members into a members x timesteps array.
+
+    Parameters:
+        ensemble (obj): Ensemble created by load_ensemble
+        values (Series or ndarray): A value for each row of the ensemble irradiance
+        fill_value (float): Value of the timesteps without a row, such as the night
+
+    Returns:
+        ndarray: Array with a row per member and a column per timestep
+    """
+    rows = ensemble['irradiance']
+    stacked = np.full((len(ensemble['members']), TIMESTEPS_PER_YEAR), fill_value, dtype=float)
+    stacked[rows.member.to_numpy(), rows.timestep.to_numpy()] = np.asarray(values, dtype=float)
+    return stacked
+
+
+def calculate_facade_yields(ensemble, facades, best_modules, modules):
+    """
+    Calculate the annual DC and AC yield of each facade for each member of the ensemble.
+
+    Parameters:
+        ensemble (obj): Ensemble created by load_ensemble
+        facades (DataFrame): Table with a row per facade
+        best_modules (DataFrame): Table with the module and number of panels per facade
+        modules (DataFrame): Module parameters with a column per module
+
+    Returns:
+        obj: Object with the 'dc' and 'ac' annual yield (in kWh) as facades x members DataFrames
+    """
+    irradiance = ensemble['irradiance']
+    yields = {'dc': [], 'ac': []}
+    for facade_index, facade in best_modules.iterrows():
+        # Calculate the power output of all members at once
+        power_info = pv.calculate_power_output(
+            irradiance, modules[facade.module], tilt=facades.tilt[facade_index],
+            azimuth=facades.azimuth[facade_index], solar=ensemble['solar'],
+            row_spacing=facades.row_spacing[facade_index])
+
+        for output in ('dc', 'ac'):
+            power = stack(ensemble, power_info[output])
+            yields[output].append(facade.num_panels * np.nansum(power, axis=1) / 1000)
+
+    return {
+        output: pd.DataFrame(yields[output], index=best_modules.index, columns=ensemble['members'])
+        for output in yields
+    }
+
+
+def summarize_yields(yields):
+    """
+    Calculate the interannual mean, standard deviation, and P90 of the annual yield of each facade.
+
+    The spread and P90 need at least two members, with a single member they are NaN.
+
+    Parameters:
+        yields (obj): Object with the 'dc' and 'ac' facades x members DataFrames from calculate_facade_yields
+
+    Returns:
+        DataFrame: Table with the mean, std, and P90 of the DC and AC yield per facade (in kWh)
+    """
+    summary = {}
+    for output, annual_yields in yields.items():
+        values = annual_yields.to_numpy()
+        has_spread = values.shape[1] > 1
+        summary[f'mean_{output}'] = values.mean(axis=1)
+        summary[f'std_{output}'] = values.std(axis=1, ddof=1) if has_spread else np.full(len(values), np.nan)
+
+        # The P90 is the yield that is exceeded in 90% of the years
+        summary[f'p90_{output}'] = np.percentile(values, 10, axis=1) if has_spread else np.full(len(values), np.nan)
+    return pd.DataFrame(summary, index=next(iter(yields.values())).index)
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+INDEX_NAMES = ['building', 'facade']
+
+
+def create_facade_table(buildings):
+    """
+    Convert the nested buildings object into a table with a row per facade.
+
+    Facades without a 'shading_factor' are not shaded (1), and facades without a 'row_spacing' do not have
+    their panels in rows (NaN), so buildings objects without these properties can still be used.
+
+    Parameters:
+        buildings (obj): Nested object with buildings and facades
+
+    Returns:
+        DataFrame: Table with a (building, facade) index and a column per facade property
+    """
+    rows = {}
+    for building_name, building in buildings.items():
+        for facade_name, facade in building.items():
+            rows[(building_name, facade_name)] = facade
+
+    facades = pd.DataFrame.from_dict(rows, orient='index')
+    facades.index = pd.MultiIndex.from_tuples(facades.index, names=INDEX_NAMES)
+    return facades.assign(
+        shading_factor=facades.get('shading_factor', pd.Series(dtype=float)).reindex(facades.index).fillna(1),
+        row_spacing=facades.get('row_spacing', pd.Series(dtype=float)).reindex(facades.index),
+    )
+
+
+def create_buildings_object(facades, results=None):
+    """
+    Convert the facade table (and optionally the results table) back into the nested buildings object.
+
+    Parameters:
+        facades (DataFrame): Table with a row per facade
+        results (DataFrame): Table with a row per facade and module (optional)
+
+    Returns:
+        obj: Nested object with buildings and facades, and the results per module if given
+    """
+    buildings = {}
+    for (building_name, facade_name), facade in facades.to_dict(orient='index').items():
+        facade = {key: value for key, value in facade.items() if not pd.isna(value)}
+        buildings.setdefault(building_name, {})[facade_name] = facade
+
+    if results is not None:
+        for (building_name, facade_name, module_name), result in results.to_dict(orient='index').items():
+            buildings[building_name][facade_name][module_name] = result
+    return buildings
+
+
+def get_labels(index):
+    """
+    Create a readable label for each facade in a (building, facade) index.
+
+    Parameters:
+        index (MultiIndex): Index with the building and facade names
+
+    Returns:
+        list: Labels formatted as 'building - facade'
+    """
+    return [f'{building_name} - {facade_name}' for building_name, facade_name in index]
+
+
+def create_results_table(facades, modules):
+    """
+    Create a table with a row for each facade and module with the number of panels and total capacity.
+
+    Parameters:
+        facades (DataFrame): Table with a row per facade
+        modules (DataFrame): Module parameters with a column per module
+
+    Returns:
+        DataFrame: Table with a (building, facade, module) index and the 'num_panels' and 'capacity' columns
+    """
+    installation_area = (facades.area * facades.coverage).to_numpy(dtype=float)
+    module_area = modules.loc['Area'].to_numpy(dtype=float)
+    module_wp = modules.loc['Wp'].to_numpy(dtype=float)
+
+    # Calculate the number of panels for each facade (rows) and module (columns) at once
+    num_panels = np.floor(installation_area[:, np.newaxis] / module_area[np.newaxis, :])
+
+    index = pd.MultiIndex.from_tuples(
+        [(*facade, module_name) for facade in facades.index for module_name in modules.columns],
+        names=[*INDEX_NAMES, 'module'])
+    return pd.DataFrame({
+        'num_panels': num_panels.ravel().astype(int),
+        'capacity': (num_panels * module_wp / 1000).ravel(),
+    }, index=index)
+
+
+def unstack_modules(results, column, modules):
+    """
+    Get a single column of the results table as a facade x module table.
+
+    Parameters:
+        results (DataFrame): Table with a row per facade and module
+        column (str): Name of the column that should be unstacked
+        modules (DataFrame): Module parameters with a column per module, used for the column order
+
+    Returns:
+        DataFrame: Table with a (building, facade) index and a column per module
+    """
+    facades = results[column].unstack('module')
+    return facades.reindex(index=results.index.droplevel('module').unique(), columns=modules.columns)
+
+
+def find_best_modules(results, *, column='total_annual_yield_dc'):
+    """
+    Find the best module for each facade and return its row of the results table.
+
+    Parameters:
+        results (DataFrame): Table with a row per facade and module
+        column (str): Name of the column that should be maximized
+
+    Returns:
+        DataFrame: Table with a (building, facade) index, the name of the best module and its results
+    """
+    values = results[column].unstack('module')
+    values = values.reindex(results.index.droplevel('module').unique())
+    best_modules = values.columns[np.argmax(values.to_numpy(), axis=1)]
+
+    best = results.loc[list(zip(values.index.get_level_values(0), values.index.get_level_values(1), best_modules))]
+    best.index = values.index
+    return best.assign(module=best_modules)
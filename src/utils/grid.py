@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+from utils import facades as facade_tables
+from utils import pv
+
+
+def calculate_facade_power(irradiance, facades, best_modules, modules, *, solar=None, output='ac'):
+    """
+    Calculate the power output of the PV system on each facade for each timestep.
+
+    Parameters:
+        irradiance (DataFrame): DataFrame with all weather and irradiance data
+        facades (DataFrame): Table with a row per facade
+        best_modules (DataFrame): Table with the module and number of panels per facade
+        modules (DataFrame): Module parameters with a column per module
+        solar (SolarContext): Solar context of the irradiance data, is created if not given
+        output (str): Either 'dc' or 'ac'
+
+    Returns:
+        DataFrame: Power output (W) with a row per timestep and a column per facade
+    """
+    solar = pv.get_solar_context(irradiance, solar)
+    power = {}
+    for facade_index, facade in best_modules.iterrows():
+        power_info = pv.calculate_power_output(
+            irradiance, modules[facade.module], tilt=facades.tilt[facade_index],
+            azimuth=facades.azimuth[facade_index], solar=solar, row_spacing=facades.row_spacing[facade_index])
+        power[facade_tables.get_labels([facade_index])[0]] = facade.num_panels * power_info[output].fillna(0)
+    return pd.DataFrame(power, index=irradiance.index)
+
+
+def create_building_configurations(best_modules):
+    """
+    Create a PV configuration for each building, which uses all facades of that building.
+
+    Parameters:
+        best_modules (DataFrame): Table with a (building, facade) index
+
+    Returns:
+        DataFrame: Table with a row per building and a column per facade, with 1 if the facade is used
+    """
+    buildings = best_modules.index.get_level_values('building')
+    return pd.DataFrame(
+        (buildings.unique().to_numpy()[:, np.newaxis] == buildings.to_numpy()[np.newaxis, :]).astype(float),
+        index=buildings.unique(), columns=facade_tables.get_labels(best_modules.index))
+
+
+def combine_facades(facade_power, configurations, index):
+    """
+    Calculate the production of each PV configuration on the timesteps of the load profiles.
+
+    The irradiance data only contains the daytime timesteps, the production of all other timesteps is zero.
+    The timesteps of the loads should therefore use the same timestamps as the irradiance (the middle of each hour).
+
+    Parameters:
+        facade_power (DataFrame): Power output (W) with a row per timestep and a column per facade
+        configurations (DataFrame): Table with a row per configuration and a column per facade, with the
+            number of times each facade is used (for example 0 or 1)
+        index (DatetimeIndex): Timesteps of the load profiles
+
+    Returns:
+        DataFrame: Production (W) with a row per timestep and a column per configuration
+    """
+    facade_power = facade_power.reindex(index=index, columns=configurations.columns, fill_value=0)
+    return pd.DataFrame(
+        facade_power.to_numpy() @ configurations.to_numpy().T, index=index, columns=configurations.index)
+
+
+def _calculate_direct_self_consumption(loads, production, *, max_elements):
+    """
+    Calculate the sum of the lowest of the load and the production over all timesteps, for all combinations.
+
+    The timesteps are calculated in blocks, so the loads x configurations x timesteps array is never
+    larger than max_elements.
+    """
+    num_loads, num_timesteps = loads.shape
+    num_configurations = production.shape[0]
+    block_size = max(1, max_elements // (num_loads * num_configurations))
+
+    self_consumption = np.zeros((num_loads, num_configurations))
+    block = np.empty((num_loads, num_configurations, min(block_size, num_timesteps)))
+    for start in range(0, num_timesteps, block_size):
+        stop = min(start + block_size, num_timesteps)
+        block_view = block[:, :, :stop - start]
+        np.minimum(loads[:, np.newaxis, start:stop], production[np.newaxis, :, start:stop], out=block_view)
+        self_consumption += block_view.sum(axis=2)
+    return self_consumption
+
+
+def _dispatch_battery(loads, production, battery):
+    """
+    Calculate the self-consumption with a battery for all combinations at once, one timestep at a time.
+
+    The battery is charged with the surplus of the PV production and discharged when the load is
+    higher than the production, within its capacity and power. The losses of the round trip
+    efficiency are applied while charging. The battery is empty at the start.
+
+    Returns:
+        ndarray: The self-consumption (Wh) per load profile and configuration
+        ndarray: The export (Wh) per load profile and configuration
+    """
+    num_loads, num_timesteps = loads.shape
+    state_of_charge = np.zeros((num_loads, production.shape[0]))
+    self_consumption = np.zeros_like(state_of_charge)
+    export = np.zeros_like(state_of_charge)
+    charge = np.empty_like(state_of_charge)
+    discharge = np.empty_like(state_of_charge)
+
+    for timestep in range(num_timesteps):
+        # A positive surplus can charge the battery, a negative surplus is the shortage
+        surplus = production[np.newaxis, :, timestep] - loads[:, np.newaxis, timestep]
+        self_consumption += np.minimum(loads[:, np.newaxis, timestep], production[np.newaxis, :, timestep])
+
+        np.clip(surplus, 0, battery['power'], out=charge)
+        np.minimum(charge, (battery['capacity'] - state_of_charge) / battery['efficiency'], out=charge)
+        np.clip(-surplus, 0, battery['power'], out=discharge)
+        np.minimum(discharge, state_of_charge, out=discharge)
+
+        state_of_charge += charge * battery['efficiency'] - discharge
+        self_consumption += discharge
+        export += np.maximum(surplus, 0) - charge
+    return self_consumption, export
+
+
+def calculate_grid_interaction(loads, production, *, battery=None, max_elements=2 ** 24):
+    """
+    Calculate the self-consumption, grid export and import, and self-sufficiency of every combination of a
+    load profile and a PV configuration at once.
+
+    Each timestep is one hour, so the power in W equals the energy in Wh.
+
+    Parameters:
+        loads (DataFrame): Load (W) with a row per timestep and a column per load profile
+        production (DataFrame): Production (W) with the same rows and a column per configuration, see combine_facades
+        battery (obj): Object with the 'capacity' (Wh), the 'power' (W), and the round trip 'efficiency' of
+            a battery for each combination (optional)
+        max_elements (int): Largest number of values that are calculated at once without a battery
+
+    Returns:
+        obj: Object with the 'self_consumption', 'export', and 'import' (kWh), 'self_consumption_ratio', and
+            'self_sufficiency' as load profiles x configurations DataFrames
+    """
+    if not loads.index.equals(production.index):
+        raise Exception('The loads and the production should have the same timesteps')
+
+    load_values = loads.to_numpy(dtype=float).T
+    production_values = production.to_numpy(dtype=float).T
+    total_load = load_values.sum(axis=1)[:, np.newaxis]
+    total_production = production_values.sum(axis=1)[np.newaxis, :]
+
+    # Without a battery all production that is not consumed directly is exported
+    if battery is None:
+        self_consumption = _calculate_direct_self_consumption(
+            load_values, production_values, max_elements=max_elements)
+        export = total_production - self_consumption
+    else:
+        self_consumption, export = _dispatch_battery(load_values, production_values, battery)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        results = {
+            'self_consumption': self_consumption / 1000,
+            'export': export / 1000,
+            'import': (total_load - self_consumption) / 1000,
+            'self_consumption_ratio': self_consumption / total_production,
+            'self_sufficiency': self_consumption / total_load,
+        }
+    return {
+        name: pd.DataFrame(values, index=loads.columns, columns=production.columns)
+        for name, values in results.items()
+    }
@@ -1,28 +1,29 @@
-import math
-
 import pandas as pd
 
 from utils import pv
+from utils.solar import SolarContext
+
+LATITUDE = 53.224
+LONGITUDE = 5.752
 
 
-def prepare_data():
+def read_knmi_file(filepath):
     """
-    Get and transform the KNMI dataset.
+    Read a raw KNMI hourly data file.
+
+    Parameters:
+        filepath (str): Path of the raw KNMI file
 
     Returns:
-        str: File path of the processed CSV data file
+        DataFrame: DataFrame with the wind, temperature, and GHI, with the middle of each hour (UTC) as index
     """
     # Import the CSV file and set the column names
-    knmi = pd.read_csv('../input/knmi_raw.csv', skiprows=range(0, 10))
+    knmi = pd.read_csv(filepath, skiprows=range(0, 10), skipinitialspace=True)
     knmi.columns = ['station', 'date', 'HH', 'wind', 'temp', 'GHI']
 
-    # Fix datetime index
-    knmi.date = knmi.date.astype(str)
-    knmi.HH = knmi.HH.apply(lambda hour: str(hour).zfill(2))
-    knmi.HH = knmi.HH.replace('24', '00')
-    knmi['datetime'] = knmi.date + knmi.HH + '00'
-    knmi['datetime'] = pd.to_datetime(knmi.datetime, format='%Y%m%d%H%M')
-    knmi['datetime'] = knmi['datetime'] + pd.Timedelta(hours=-1, minutes=30)
+    # Fix datetime index, hour 1 is the hour from 00:00 to 01:00
+    knmi['datetime'] = pd.to_datetime(knmi.date.astype(str), format='%Y%m%d')
+    knmi['datetime'] = knmi['datetime'] + pd.to_timedelta(knmi.HH - 1, unit='h') + pd.Timedelta(minutes=30)
 
     # Set the datetime as index and keep only the wind, temperature, and GHI column
     knmi.index = knmi.datetime
@@ -35,6 +36,40 @@ def prepare_data():
 
     # Fix timezone UTC
     knmi.index = knmi.index.tz_localize('UTC')
+    return knmi
+
+
+def read_knmi_station(filepath):
+    """
+    Read the station number, name, and coordinates from the header of a raw KNMI hourly data file.
+
+    Parameters:
+        filepath (str): Path of the raw KNMI file
+
+    Returns:
+        obj: Object with the 'station' number, 'name', 'latitude', and 'longitude'
+    """
+    with open(filepath) as knmi_file:
+        for line in knmi_file:
+            # The station line follows the '# STN LON(east) LAT(north) ALT(m) NAME' line
+            if line.startswith('# STN') and 'LAT(north)' in line:
+                station, longitude, latitude, _, *name = next(knmi_file).lstrip('# ').split()
+                return {'station': int(station), 'name': ' '.join(name),
+                        'latitude': float(latitude), 'longitude': float(longitude)}
+    raise Exception(f'The KNMI file has no station header: {filepath}')
+
+
+def prepare_data(filepath='../input/knmi_raw.csv'):
+    """
+    Get and transform the KNMI dataset.
+
+    Parameters:
+        filepath (str): Path of the raw KNMI file
+
+    Returns:
+        str: File path of the processed CSV data file
+    """
+    knmi = read_knmi_file(filepath)
 
     # Export to new csv
     file_path = '../output/question2/knmi.csv'
@@ -42,21 +77,31 @@ def prepare_data():
     return file_path
 
 
-def get_irradiance():
+def get_irradiance_with_solar_context():
     """
-    Get the KNMI data and calculate the irradiance for each timestep.
+    Get the KNMI data, calculate the irradiance for each timestep, and create the solar context.
 
     Returns:
         DataFrame: Single DataFrame with all weather and irradiance data
+        SolarContext: Solar context of the irradiance data
     """
-    latitude = 53.224
-    longitude = 5.752
-
     # Get the irradiance data from the KNMI data
     filename = prepare_data()
-    irradiance = pv.get_irradiance(filename, latitude=latitude, longitude=longitude, index_col='datetime', temp_col='temp')
+    irradiance = pv.get_irradiance(filename, latitude=LATITUDE, longitude=LONGITUDE, index_col='datetime', temp_col='temp')
+    solar = SolarContext(irradiance, latitude=LATITUDE, longitude=LONGITUDE)
 
     # Get the DNI and DHI
-    irradiance['DNI'] = pv.calculate_dni('dirindex', irradiance, latitude=latitude, longitude=longitude)
-    irradiance['DHI'] = irradiance.GHI - irradiance.DNI * irradiance.solar_zenith.apply(math.radians).apply(math.cos)
+    irradiance['DNI'] = pv.calculate_dni('dirindex', irradiance, latitude=LATITUDE, longitude=LONGITUDE, solar=solar)
+    irradiance['DHI'] = irradiance.GHI - irradiance.DNI * solar.cos_zenith
+    return irradiance, solar
+
+
+def get_irradiance():
+    """
+    Get the KNMI data and calculate the irradiance for each timestep.
+
+    Returns:
+        DataFrame: Single DataFrame with all weather and irradiance data
+    """
+    irradiance, _ = get_irradiance_with_solar_context()
     return irradiance
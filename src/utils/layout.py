@@ -0,0 +1,192 @@
+import numpy as np
+import pvlib
+
+
+def calculate_shaded_fraction(tilt, azimuth, row_spacing, irradiance):
+    """
+    Calculate the fraction of each row that is shaded by the row in front of it for each timestep.
+
+    Parameters:
+        tilt (float or ndarray): Tilt of the panels (degrees)
+        azimuth (float or ndarray): Azimuth of the panels (degrees)
+        row_spacing (float or ndarray): Distance between the rows divided by the length of the panels along
+            the slope, panels without rows (NaN) are not shaded
+        irradiance (DataFrame or obj): DataFrame with the solar position, or a single row of it
+
+    Returns:
+        ndarray: Shaded fraction (between 0 and 1) for each timestep
+    """
+    tilt = np.radians(tilt)
+    elevation = np.radians(np.asarray(irradiance['solar_elevation'], dtype=float))
+    relative_azimuth = np.radians(np.asarray(irradiance['solar_azimuth'], dtype=float) - azimuth)
+
+    # Horizontal distance between the bottom of a row and the shadow of its top edge, relative to the panel length
+    projection = np.cos(tilt) + np.sin(tilt) * np.cos(relative_azimuth) / np.tan(elevation)
+
+    # If the sun is behind the plane of the panels there is no direct irradiance to shade
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shaded_fraction = np.where(projection > 0, 1 - row_spacing / projection, 0)
+    return np.nan_to_num(np.clip(shaded_fraction, 0, 1))
+
+
+def calculate_sky_diffuse_loss(tilt, row_spacing):
+    """
+    Calculate the fraction of the sky diffuse irradiance that is blocked by the row in front of the panels.
+
+    Parameters:
+        tilt (float or ndarray): Tilt of the panels (degrees)
+        row_spacing (float or ndarray): Distance between the rows divided by the length of the panels along
+            the slope, panels without rows (NaN) are not shaded
+
+    Returns:
+        float or ndarray: Fraction of the isotropic sky diffuse irradiance that is lost (between 0 and 1)
+    """
+    masking_angle = pvlib.shading.masking_angle_passias(tilt, 1 / np.asarray(row_spacing, dtype=float))
+    return pvlib.shading.sky_diffuse_passias(masking_angle)
+
+
+def calculate_shaded_poa(irradiance, *, tilt, azimuth, row_spacing):
+    """
+    Calculate the POA irradiance of panels in rows for each timestep, with the shading of the direct and
+    the sky diffuse irradiance by the row in front of them.
+
+    Parameters:
+        irradiance (DataFrame or obj): DataFrame with the irradiance, or a single row of it
+        tilt (float or ndarray): Tilt of the panels (degrees)
+        azimuth (float or ndarray): Azimuth of the panels (degrees)
+        row_spacing (float or ndarray): Distance between the rows divided by the length of the panels along
+            the slope, panels without rows (NaN) are not shaded
+
+    Returns:
+        obj: Object with the shaded 'poa_global', 'poa_direct', and 'poa_diffuse'
+    """
+    poa = pvlib.irradiance.get_total_irradiance(
+        tilt, azimuth, irradiance['solar_zenith'], irradiance['solar_azimuth'],
+        irradiance['DNI'], irradiance['GHI'], irradiance['DHI'])
+    shaded_fraction = calculate_shaded_fraction(tilt, azimuth, row_spacing, irradiance)
+    sky_diffuse_loss = calculate_sky_diffuse_loss(tilt, row_spacing)
+
+    poa_direct = (1 - shaded_fraction) * poa['poa_direct']
+    poa_diffuse = poa['poa_diffuse'] - sky_diffuse_loss * poa['poa_sky_diffuse']
+    return {'poa_global': poa_direct + poa_diffuse, 'poa_direct': poa_direct, 'poa_diffuse': poa_diffuse}
+
+
+def calculate_break_even_irradiance(*, panel_cost, lifetime, interest_rate, efficiency, performance_ratio,
+                                    electricity_price):
+    """
+    Calculate the annual POA irradiance per m2 of panel at which the electricity of a panel pays its annual cost.
+
+    The cost of the panel is spread over its lifetime as an annuity, and each kWh of POA irradiance
+    gives efficiency * performance_ratio kWh of electricity.
+
+    Parameters:
+        panel_cost (float): Installed cost of a m2 of panel (EUR/m2)
+        lifetime (int): Lifetime of the panels (years)
+        interest_rate (float): Yearly interest rate of the investment
+        efficiency (float): STC efficiency of the panels
+        performance_ratio (float): Ratio of the AC yield and the yield at STC efficiency
+        electricity_price (float): Value of the produced electricity (EUR/kWh)
+
+    Returns:
+        float: Break-even irradiance (kWh/m2 of panel per year)
+    """
+    annuity_factor = interest_rate / (1 - (1 + interest_rate) ** -lifetime)
+    return panel_cost * annuity_factor / (efficiency * performance_ratio * electricity_price)
+
+
+def optimize_rooftop(irradiance, *, tilts, azimuths, row_spacings, break_even_irradiance, tolerance=1 / 64):
+    """
+    Find the tilt, azimuth, and row spacing with the highest net annual irradiance per m2 of rooftop.
+
+    A smaller row spacing places more panels on the rooftop, but each panel receives less irradiance
+    because the row in front of it blocks part of the direct and the sky diffuse irradiance. The
+    irradiance per m2 of rooftop therefore keeps increasing up to a fully covered rooftop, so each m2
+    of panel is charged the irradiance it needs to earn itself back (the break-even irradiance). The net
+    irradiance per m2 of rooftop is (poa - break_even_irradiance) * coverage, which is highest where
+    the extra irradiance of a denser layout no longer pays for the extra panels.
+
+    The optimum is found with a coarse-to-fine pattern search: each step tries to move the tilt,
+    azimuth and row spacing up and down, and halves the step size when none of them is an improvement.
+    The POA irradiance is only calculated once for each orientation.
+
+    Parameters:
+        irradiance (DataFrame): DataFrame with the irradiance
+        tilts (tuple): Lower and upper bound of the tilt (degrees)
+        azimuths (tuple): Lower and upper bound of the azimuth (degrees)
+        row_spacings (tuple): Lower and upper bound of the distance between the rows divided by the panel length
+        break_even_irradiance (float): Annual POA irradiance (kWh/m2 of panel) that is needed to earn back a panel
+        tolerance (float): Smallest step size relative to the range of each bound
+
+    Returns:
+        obj: Object with the optimal 'tilt', 'azimuth', 'row_spacing', and 'coverage', the shaded 'poa_total'
+            per m2 of panel (in kWh), the 'shading_factor' (shaded divided by unshaded POA), the 'net_poa'
+            per m2 of rooftop (in kWh), the parameters that ended at one of their bounds ('bounds_reached'),
+            and the number of 'evaluations' and 'orientations' calculated
+    """
+    lower_bounds = np.array([tilts[0], azimuths[0], row_spacings[0]], dtype=float)
+    ranges = np.array([tilts[1], azimuths[1], row_spacings[1]], dtype=float) - lower_bounds
+    orientations = {}
+    evaluations = {}
+
+    def get_poa(tilt, azimuth):
+        if (tilt, azimuth) not in orientations:
+            poa = pvlib.irradiance.get_total_irradiance(
+                tilt, azimuth, irradiance.solar_zenith, irradiance.solar_azimuth,
+                irradiance.DNI, irradiance.GHI, irradiance.DHI)
+            orientations[(tilt, azimuth)] = {
+                'direct': poa.poa_direct.to_numpy(),
+                'diffuse': poa.poa_diffuse.sum() / 1000,
+                'sky_diffuse': poa.poa_sky_diffuse.sum() / 1000,
+                'total': poa.poa_global.sum() / 1000,
+            }
+        return orientations[(tilt, azimuth)]
+
+    def calculate_poa_total(position):
+        tilt, azimuth, row_spacing = lower_bounds + np.array(position) * ranges
+        poa = get_poa(tilt, azimuth)
+        shaded_fraction = calculate_shaded_fraction(tilt, azimuth, row_spacing, irradiance)
+        poa_direct = np.nansum((1 - shaded_fraction) * poa['direct']) / 1000
+        poa_diffuse = poa['diffuse'] - calculate_sky_diffuse_loss(tilt, row_spacing) * poa['sky_diffuse']
+        return {'shaded': poa_direct + poa_diffuse, 'unshaded': poa['total'], 'row_spacing': row_spacing}
+
+    def evaluate(position):
+        if position not in evaluations:
+            poa_total = calculate_poa_total(position)
+            evaluations[position] = (poa_total['shaded'] - break_even_irradiance) / poa_total['row_spacing']
+        return evaluations[position]
+
+    # Start in the middle of the bounds and only search the dimensions that have a range
+    position = (0.5, 0.5, 0.5)
+    dimensions = [dimension for dimension in range(3) if ranges[dimension] > 0]
+    step = 0.25
+    while step >= tolerance:
+        candidates = []
+        for dimension in dimensions:
+            for direction in (-1, 1):
+                candidate = list(position)
+                candidate[dimension] = min(max(candidate[dimension] + direction * step, 0), 1)
+                candidates.append(tuple(candidate))
+
+        best_candidate = max(candidates, key=evaluate)
+        if evaluate(best_candidate) > evaluate(position):
+            position = best_candidate
+        else:
+            step /= 2
+
+    tilt, azimuth, row_spacing = lower_bounds + np.array(position) * ranges
+    poa_total = calculate_poa_total(position)
+    return {
+        'tilt': float(tilt),
+        'azimuth': float(azimuth),
+        'row_spacing': float(row_spacing),
+        'coverage': float(1 / row_spacing),
+        'poa_total': float(poa_total['shaded']),
+        'shading_factor': float(poa_total['shaded'] / poa_total['unshaded']),
+        'net_poa': float(evaluate(position)),
+        'bounds_reached': [
+            name for dimension, name in enumerate(('tilt', 'azimuth', 'row_spacing'))
+            if dimension in dimensions and position[dimension] in (0, 1)
+        ],
+        'evaluations': len(evaluations),
+        'orientations': len(orientations),
+    }
@@ -1,3 +1,4 @@
+import numpy as np
 from scipy import stats
 
 
@@ -20,6 +21,86 @@ def compare_series(series_a, series_b):
     }
 
 
+class ErrorAccumulator:
+    """
+    Running RMSE, MBE, MAE, R2, and error histogram of two data series that arrive in blocks.
+
+    Only sums, means, and the sums of squared deviations (combined per block with the parallel
+    Welford algorithm) are kept, so the memory does not depend on the length of the series.
+    Pairs where one of the values is missing are skipped.
+
+    Parameters:
+        bins (ndarray): Edges of the error histogram, errors outside the edges are counted in the outer bins
+    """
+
+    def __init__(self, bins):
+        self.bins = np.asarray(bins, dtype=float)
+        self.histogram = np.zeros(len(self.bins) - 1, dtype=int)
+        self.count = 0
+        self.sum_error = 0.0
+        self.sum_absolute_error = 0.0
+        self.sum_squared_error = 0.0
+        self.mean_a = 0.0
+        self.mean_b = 0.0
+        self.squared_deviations_a = 0.0
+        self.squared_deviations_b = 0.0
+        self.products_of_deviations = 0.0
+
+    def update(self, series_a, series_b):
+        """
+        Add a block of both data series.
+
+        Parameters:
+            series_a (Series or ndarray): Block of the first data series
+            series_b (Series or ndarray): Block of the second data series
+        """
+        values_a = np.asarray(series_a, dtype=float)
+        values_b = np.asarray(series_b, dtype=float)
+        is_available = ~(np.isnan(values_a) | np.isnan(values_b))
+        values_a = values_a[is_available]
+        values_b = values_b[is_available]
+        count = len(values_a)
+        if count == 0:
+            return
+
+        error = values_b - values_a
+        self.sum_error += error.sum()
+        self.sum_absolute_error += np.abs(error).sum()
+        self.sum_squared_error += (error ** 2).sum()
+        self.histogram += np.histogram(np.clip(error, self.bins[0], self.bins[-1]), bins=self.bins)[0]
+
+        # Combine the means and the sums of squared deviations of the block with the running ones
+        mean_a = values_a.mean()
+        mean_b = values_b.mean()
+        delta_a = mean_a - self.mean_a
+        delta_b = mean_b - self.mean_b
+        total_count = self.count + count
+        weight = self.count * count / total_count
+        self.squared_deviations_a += ((values_a - mean_a) ** 2).sum() + delta_a ** 2 * weight
+        self.squared_deviations_b += ((values_b - mean_b) ** 2).sum() + delta_b ** 2 * weight
+        self.products_of_deviations += ((values_a - mean_a) * (values_b - mean_b)).sum() + delta_a * delta_b * weight
+        self.mean_a += delta_a * count / total_count
+        self.mean_b += delta_b * count / total_count
+        self.count = total_count
+
+    def get_errors(self):
+        """
+        Get the errors of all blocks so far.
+
+        Returns:
+            obj: Object with the 'rmse', 'mbe', 'mae', 'rsqr' values, the same as compare_series
+        """
+        if self.count == 0:
+            raise Exception('No values have been added yet')
+
+        return {
+            'rmse': (self.sum_squared_error / self.count) ** 0.5,
+            'mbe': self.sum_error / self.count,
+            'mae': self.sum_absolute_error / self.count,
+            'rsqr': self.products_of_deviations ** 2 / (self.squared_deviations_a * self.squared_deviations_b),
+        }
+
+
 def print_object(dict_to_print, *, name='', uppercase=False):
     """
     Print the values of an object nicely on a single line.
@@ -0,0 +1,265 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pvlib
+
+from utils import pv
+
+SAPM_PARAMETERS = [
+    'Cells_in_Series', 'Isco', 'Voco', 'Impo', 'Vmpo', 'Aisc', 'Aimp', 'C0', 'C1', 'Bvoco', 'Mbvoc', 'Bvmpo', 'Mbvmp',
+    'N', 'C2', 'C3', 'A0', 'A1', 'A2', 'A3', 'A4', 'B0', 'B1', 'B2', 'B3', 'B4', 'B5', 'DTC', 'FD', 'A', 'B',
+]
+CEC_PARAMETERS = ['alpha_sc', 'a_ref', 'I_L_ref', 'I_o_ref', 'R_sh_ref', 'R_s', 'Adjust', 'T_NOCT', 'Area', 'Wp']
+
+
+def _read_modules(source):
+    """
+    Read the module parameters from an Excel file, a SAM CSV file, or a database bundled with pvlib.
+
+    Parameters:
+        source (str): Path of an .xlsx or .csv file, or 'SandiaMod' or 'CECMod'
+
+    Returns:
+        DataFrame: Numeric module parameters with a column per module, including the 'Area' and 'Wp'
+    """
+    if source.endswith('.xlsx'):
+        modules = pd.read_excel(source, index_col='Parameters')
+    elif source.endswith('.csv'):
+        modules = pvlib.pvsystem.retrieve_sam(path=source)
+    else:
+        modules = pvlib.pvsystem.retrieve_sam(source)
+
+    # Keep only the numeric parameters
+    modules = modules.apply(pd.to_numeric, axis=1, errors='coerce').dropna(how='all').astype(float)
+
+    # The CEC database uses different names for the area and peak power
+    if 'Area' not in modules.index and 'A_c' in modules.index:
+        modules.loc['Area'] = modules.loc['A_c']
+    if 'Wp' not in modules.index:
+        modules.loc['Wp'] = modules.loc['STC'] if 'STC' in modules.index else modules.loc['Impo'] * modules.loc['Vmpo']
+    return modules
+
+
+def load_modules(source, *, cache_directory='../output/cache'):
+    """
+    Load the module parameters and cache them as a binary file, so they only have to be parsed once.
+
+    Parameters:
+        source (str): Path of an .xlsx or .csv file, or 'SandiaMod' or 'CECMod'
+        cache_directory (str): Directory where the cached parameters are stored
+
+    Returns:
+        DataFrame: Numeric module parameters with a column per module, including the 'Area' and 'Wp'
+    """
+    # Files with the same name in different directories get their own cache, so the absolute path is part of the key
+    is_file = os.path.isfile(source)
+    cache_name = os.path.basename(source)
+    if is_file:
+        cache_name += '-' + hashlib.sha1(os.path.abspath(source).encode()).hexdigest()[:12]
+    cache_path = os.path.join(cache_directory, f'{cache_name}.npz')
+
+    # Use the cached parameters if they are newer than the source file
+    if os.path.isfile(cache_path) and (not is_file or os.path.getmtime(cache_path) >= os.path.getmtime(source)):
+        with np.load(cache_path) as cache:
+            return pd.DataFrame(cache['values'], index=cache['parameters'], columns=cache['modules'])
+
+    modules = _read_modules(source)
+    os.makedirs(cache_directory, exist_ok=True)
+    np.savez(cache_path, values=modules.to_numpy(), parameters=modules.index.to_numpy(dtype=str),
+             modules=modules.columns.to_numpy(dtype=str))
+    return modules
+
+
+def create_index(modules):
+    """
+    Create an index with the area, peak power, and STC efficiency of each module, sorted by efficiency.
+
+    Parameters:
+        modules (DataFrame): Module parameters with a column per module
+
+    Returns:
+        DataFrame: Table with the 'area', 'wp', and 'efficiency' per module
+    """
+    module_index = pd.DataFrame({
+        'area': modules.loc['Area'],
+        'wp': modules.loc['Wp'],
+        'efficiency': modules.loc['Wp'] / (modules.loc['Area'] * 1000),
+    }).dropna()
+    return module_index.sort_values('efficiency', ascending=False)
+
+
+def select_modules(module_index, *, max_area=None, min_wp=None, min_efficiency=None):
+    """
+    Select the modules in the index that meet all given limits.
+
+    Parameters:
+        module_index (DataFrame): Index created by create_index
+        max_area (float): Largest area of a single module (m2)
+        min_wp (float): Smallest peak power of a single module (W)
+        min_efficiency (float): Smallest STC efficiency
+
+    Returns:
+        DataFrame: The part of the index that meets the limits
+    """
+    selection = np.ones(len(module_index), dtype=bool)
+    if max_area is not None:
+        selection &= module_index.area.to_numpy() <= max_area
+    if min_wp is not None:
+        selection &= module_index.wp.to_numpy() >= min_wp
+    if min_efficiency is not None:
+        selection &= module_index.efficiency.to_numpy() >= min_efficiency
+    return module_index[selection]
+
+
+def _get_model(modules):
+    """
+    Get the model that can calculate the power output of the modules, the SAPM or the CEC single diode model.
+    """
+    for model, parameters in (('sapm', SAPM_PARAMETERS), ('cec', CEC_PARAMETERS)):
+        if all(name in modules.index for name in parameters):
+            return model
+    raise Exception('The modules have neither all SAPM parameters nor all CEC parameters')
+
+
+def _calculate_power_dc(model, module, *, poa_global, poa_direct, poa_diffuse, aoi, absolute_airmass, temp_air, wind):
+    """
+    Calculate the DC power of a batch of modules with the SAPM or the CEC single diode model.
+
+    The irradiance and weather are column vectors and the module parameters rows, so the result has a
+    row per timestep and a column per module.
+    """
+    if model == 'sapm':
+        temp_cell = pvlib.temperature.sapm_cell(poa_global, temp_air, wind, module['A'], module['B'], module['DTC'])
+        effective_irradiance = pvlib.pvsystem.sapm_effective_irradiance(
+            poa_direct, poa_diffuse, absolute_airmass, aoi, module)
+        return pvlib.pvsystem.sapm(effective_irradiance, temp_cell, module)['p_mp']
+
+    # The CEC database has no SAPM coefficients, so the reflection losses use the physical model and the
+    # cell temperature the NOCT model of SAM, as pvlib does for CEC modules
+    effective_irradiance = poa_direct * pvlib.iam.physical(aoi) + poa_diffuse
+    temp_cell = pvlib.temperature.noct_sam(
+        poa_global, temp_air, wind, module['T_NOCT'], module['Wp'] / (module['Area'] * 1000),
+        effective_irradiance=effective_irradiance)
+    parameters = pvlib.pvsystem.calcparams_cec(
+        effective_irradiance, temp_cell, module['alpha_sc'], module['a_ref'], module['I_L_ref'], module['I_o_ref'],
+        module['R_sh_ref'], module['R_s'], module['Adjust'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pvlib.singlediode.bishop88_mpp(*parameters, method='newton')[2]
+
+
+def _calculate_annual_yield_dc(irradiance, modules, poa, aoi, absolute_airmass, *, batch_size):
+    """
+    Calculate the annual DC yield of a single panel of each module from the POA irradiance of the facade.
+    """
+    # The POA, AOI, and airmass are the same for each module, so they are used as a column vector
+    conditions = {
+        'poa_global': np.asarray(poa['poa_global'], dtype=float)[:, np.newaxis],
+        'poa_direct': np.asarray(poa['poa_direct'], dtype=float)[:, np.newaxis],
+        'poa_diffuse': np.asarray(poa['poa_diffuse'], dtype=float)[:, np.newaxis],
+        'aoi': aoi.to_numpy()[:, np.newaxis],
+        'absolute_airmass': absolute_airmass.to_numpy()[:, np.newaxis],
+        'temp_air': irradiance.temp.to_numpy()[:, np.newaxis],
+        'wind': irradiance.wind.to_numpy()[:, np.newaxis],
+    }
+    model = _get_model(modules)
+    parameters = SAPM_PARAMETERS if model == 'sapm' else CEC_PARAMETERS
+
+    annual_yield = np.empty(modules.shape[1])
+    for start in range(0, modules.shape[1], batch_size):
+        batch = modules.iloc[:, start:start + batch_size]
+        module = {name: batch.loc[name].to_numpy() for name in parameters}
+
+        # Each row is a timestep and each column a module
+        power_dc = _calculate_power_dc(model, module, **conditions)
+        annual_yield[start:start + batch_size] = np.nansum(power_dc, axis=0) / 1000
+
+    return pd.Series(annual_yield, index=modules.columns)
+
+
+def calculate_annual_yield_dc(irradiance, modules, *, tilt, azimuth, row_spacing=None, solar=None, batch_size=64):
+    """
+    Calculate the annual DC yield of a single panel of each module, for a batch of modules at once.
+
+    Modules with SAPM parameters, such as the Sandia database, are calculated with the SAPM, and modules
+    with only the single diode parameters of the CEC database with the CEC model.
+
+    Parameters:
+        irradiance (DataFrame): DataFrame with all weather and irradiance data
+        modules (DataFrame): Module parameters with a column per module
+        tilt (float or int): Tilt angle of the panels (degrees)
+        azimuth (float or int): Azimuth angle of the panels (degrees)
+        row_spacing (float): Distance between the rows divided by the panel length, see pv.calculate_poa (optional)
+        solar (SolarContext): Solar context of the irradiance data, is created if not given
+        batch_size (int): Number of modules that are calculated at once
+
+    Returns:
+        Series: Annual DC yield of a single panel per module (kWh)
+    """
+    # Check that the modules can be calculated before the POA is calculated
+    _get_model(modules)
+    solar = pv.get_solar_context(irradiance, solar)
+    poa = pv.calculate_poa(irradiance, tilt=tilt, azimuth=azimuth, row_spacing=row_spacing)
+    return _calculate_annual_yield_dc(
+        irradiance, modules, poa, solar.calculate_aoi(tilt, azimuth), solar.absolute_airmass, batch_size=batch_size)
+
+
+def screen_modules(irradiance, modules, module_index, *, installation_area, tilt, azimuth, row_spacing=None,
+                   solar=None, batch_size=64, margin=1.15):
+    """
+    Find the module with the highest total annual DC yield for a facade without calculating every module.
+
+    The total yield of a module can not be much higher than its installed peak power times the annual
+    POA irradiance. The modules are calculated in order of this upper bound, and the search stops as
+    soon as the upper bound of the remaining modules is lower than the best yield found so far.
+
+    Parameters:
+        irradiance (DataFrame): DataFrame with all weather and irradiance data
+        modules (DataFrame): Module parameters with a column per module
+        module_index (DataFrame): Index created by create_index, only these modules are screened
+        installation_area (float): Area of the facade that can be covered with panels (m2)
+        tilt (float or int): Tilt angle of the facade (degrees)
+        azimuth (float or int): Azimuth angle of the facade (degrees)
+        row_spacing (float): Row spacing of the facade, so the shading is the same as in question 3, see
+            pv.calculate_poa (optional)
+        solar (SolarContext): Solar context of the irradiance data, is created if not given
+        batch_size (int): Number of modules that are calculated at once
+        margin (float): Factor on the upper bound for temperature and spectral gains above STC
+
+    Returns:
+        obj: Object with the best 'module', its 'num_panels' and 'total_annual_yield_dc' (kWh),
+            and the number of 'candidates' and 'evaluated' modules
+    """
+    # The shaded POA and AOI of the facade are calculated once, for the upper bounds and the yield of every batch
+    _get_model(modules)
+    solar = pv.get_solar_context(irradiance, solar)
+    poa = pv.calculate_poa(irradiance, tilt=tilt, azimuth=azimuth, row_spacing=row_spacing)
+    aoi = solar.calculate_aoi(tilt, azimuth)
+    poa_total = poa['poa_global'].sum() / 1000
+
+    # Calculate the upper bound of all modules that fit at least once, and sort them from high to low
+    candidates = select_modules(module_index, max_area=installation_area)
+    num_panels = np.floor(installation_area / candidates.area.to_numpy())
+    upper_bounds = num_panels * candidates.wp.to_numpy() / 1000 * poa_total * margin
+    order = np.argsort(-upper_bounds)
+
+    best = {'module': None, 'num_panels': 0, 'total_annual_yield_dc': 0.0}
+    evaluated = 0
+    while evaluated < len(order) and upper_bounds[order[evaluated]] > best['total_annual_yield_dc']:
+        batch = order[evaluated:evaluated + batch_size]
+        annual_yield = _calculate_annual_yield_dc(
+            irradiance, modules[candidates.index[batch]], poa, aoi, solar.absolute_airmass,
+            batch_size=batch_size).to_numpy()
+        total_annual_yield = num_panels[batch] * annual_yield
+        evaluated += len(batch)
+
+        best_in_batch = np.argmax(total_annual_yield)
+        if total_annual_yield[best_in_batch] > best['total_annual_yield_dc']:
+            best = {
+                'module': candidates.index[batch[best_in_batch]],
+                'num_panels': int(num_panels[batch[best_in_batch]]),
+                'total_annual_yield_dc': float(total_annual_yield[best_in_batch]),
+            }
+
+    return {**best, 'candidates': len(candidates), 'evaluated': evaluated}
@@ -1,6 +1,10 @@
+import numpy as np
 import pandas as pd
 import pvlib
 
+from utils import decomposition, layout
+from utils.solar import SolarContext
+
 
 def get_irradiance(filename, *, latitude, longitude, index_col='timestamp', temp_col):
     """
@@ -19,25 +23,46 @@ def get_irradiance(filename, *, latitude, longitude, index_col='timestamp', temp
     # TODO: check if dataset exists in UTC timezone.
     irradiance = pd.read_csv(
         filename, sep=';', index_col=index_col, parse_dates=True)
+    return calculate_solar_position(irradiance, latitude=latitude, longitude=longitude, temp_col=temp_col)
+
+
+def calculate_solar_position(irradiance, *, latitude, longitude, temp_col):
+    """
+    Calculate the position of the sun and merge this with the irradiance DataFrame.
+
+    Parameters:
+        irradiance (DataFrame): DataFrame with the weather data and a UTC datetime index
+        latitude (float): Latitude
+        longitude (float): Longitude
+        temp_col (string): Name of the column with the temperature
+
+    Returns:
+        DataFrame: The irradiance DataFrame with the solar info, for the timestamps where the solar elevation is above 4
+    """
     solar_position = pvlib.solarposition.ephemeris(
         irradiance.index, latitude, longitude, temperature=irradiance[temp_col])
 
+    irradiance = irradiance.copy()
     for column_name, column in solar_position.items():
         new_column_name = column_name if column_name.startswith(
             'solar') else f'solar_{column_name}'
-        irradiance[new_column_name] = solar_position[column_name]
+        irradiance[new_column_name] = column.to_numpy()
 
     # Remove all timestamps where the solar elevation is less than 4
     return irradiance[irradiance.solar_elevation > 4]
 
 
-def calculate_dni(model, irradiance, *, latitude, longitude):
+def calculate_dni(model, irradiance, *, latitude, longitude, solar=None, fast=True):
     """
     Calculate the DNI based on the model, irradiance, and solar position.
 
     Parameters:
         model (string): The name of the model, has to be either 'disc', 'dirint', 'dirindex', or 'erbs'
         irradiance (DataFrame): DataFrame with all weather and irradiance data
+        latitude (float): Latitude
+        longitude (float): Longitude
+        solar (SolarContext): Solar context of the irradiance data, is created if not given
+        fast (bool): Whether to use the NumPy implementation of 'dirint' and 'dirindex' instead of pvlib
 
     Returns:
         Series: The DNI series
@@ -46,28 +71,115 @@ def calculate_dni(model, irradiance, *, latitude, longitude):
     time = irradiance.index
     ghi = irradiance.GHI
     zenith = irradiance['solar_zenith']
-    apparent_zenith = irradiance['solar_apparent_zenith']
 
     # Calculate and return the DNI for a specific type
     if model == 'disc':
         return pvlib.irradiance.disc(ghi, zenith, time).dni
     if model == 'dirint':
+        if fast:
+            solar = get_solar_context(irradiance, solar, latitude=latitude, longitude=longitude)
+            return decomposition.dirint(
+                ghi, zenith, time, extra_radiation=solar.extra_radiation, airmass=solar.kasten_airmass)
         return pvlib.irradiance.dirint(ghi, zenith, time)
     if model == 'dirindex':
-        relative_airmass = pvlib.atmosphere.get_relative_airmass(
-            apparent_zenith)
-        absolute_airmass = pvlib.atmosphere.get_absolute_airmass(
-            relative_airmass)
-        linke_turbidity = pvlib.clearsky.lookup_linke_turbidity(
-            time, latitude, longitude)
-        clearsky = pvlib.clearsky.ineichen(
-            apparent_zenith, absolute_airmass, linke_turbidity, perez_enhancement=True)
+        solar = get_solar_context(irradiance, solar, latitude=latitude, longitude=longitude)
+        clearsky = solar.clearsky
+        if fast:
+            return decomposition.dirindex(
+                ghi, clearsky['ghi'], clearsky['dni'], zenith, time, extra_radiation=solar.extra_radiation,
+                airmass=solar.kasten_airmass)
         return pvlib.irradiance.dirindex(ghi, clearsky['ghi'], clearsky['dni'], zenith=zenith, times=time)
     if model == 'erbs':
         return pvlib.irradiance.erbs(ghi, zenith, time).dni
     raise Exception('Invalid GHI-DNI model type')
 
 
+def read_irradiance_blocks(filename, *, latitude, longitude, index_col='timestamp', temp_col, block_size):
+    """
+    Read the irradiance data in blocks and calculate the position of the sun for each block.
+
+    Only one block is in memory at a time. The solar position of a timestamp does not depend on
+    the other timestamps, so each block gets the same solar info as in get_irradiance.
+
+    Parameters:
+        filename (string): Name of the CSV file with the irradiance data
+        latitude (float): Latitude
+        longitude (float): Longitude
+        index_col (string): Name of the column that should be used as index (default is timestamp)
+        temp_col (string): Name of the column with the temperature
+        block_size (int): Number of rows of the CSV file in each block
+
+    Yields:
+        DataFrame: A block of the input file with the solar info, see get_irradiance
+    """
+    blocks = pd.read_csv(filename, sep=';', index_col=index_col, parse_dates=True, chunksize=block_size)
+    for block in blocks:
+        yield calculate_solar_position(block, latitude=latitude, longitude=longitude, temp_col=temp_col)
+
+
+def _add_dni(models, irradiance, *, latitude, longitude):
+    """
+    Add a 'dni_' column for each model to the irradiance data.
+    """
+    solar = SolarContext(irradiance, latitude=latitude, longitude=longitude)
+    return irradiance.assign(**{
+        f'dni_{model}': calculate_dni(model, irradiance, latitude=latitude, longitude=longitude, solar=solar)
+        for model in models
+    })
+
+
+def calculate_dni_blocks(models, irradiance_blocks, *, latitude, longitude):
+    """
+    Calculate the DNI of several models for a stream of irradiance blocks.
+
+    DIRINT and DIRINDEX use the clearness index of the previous and next timestep. Therefore the
+    last row of each block is held back until the next block has arrived, and is calculated
+    together with the row before it, so the result is the same as calculating all rows at once.
+
+    Parameters:
+        models (list): Names of the models, see calculate_dni
+        irradiance_blocks (iterable): DataFrames with consecutive blocks of the irradiance and solar position
+        latitude (float): Latitude
+        longitude (float): Longitude
+
+    Yields:
+        DataFrame: A block of the irradiance data with a 'dni_' column per model
+    """
+    pending = None
+    for block in irradiance_blocks:
+        # Skip the blocks without daytime rows
+        if block.empty:
+            continue
+
+        # The first row of the pending rows is only used as the previous timestep of the second row
+        irradiance = block if pending is None else pd.concat([pending, block])
+        start = 0 if pending is None else len(pending) - 1
+        yield _add_dni(models, irradiance, latitude=latitude, longitude=longitude).iloc[start:-1]
+        pending = irradiance.iloc[-2:]
+
+    # The last row does not have a next timestep
+    if pending is not None:
+        yield _add_dni(models, pending, latitude=latitude, longitude=longitude).iloc[-1:]
+
+
+def get_solar_context(irradiance, solar=None, *, latitude=None, longitude=None):
+    """
+    Get the solar context for the irradiance data, or create it if it doesn't exist yet.
+
+    Parameters:
+        irradiance (DataFrame): DataFrame with all weather and irradiance data
+        solar (SolarContext): Solar context of the same or a larger dataset (optional)
+        latitude (float): Latitude, used when a new solar context is created
+        longitude (float): Longitude, used when a new solar context is created
+
+    Returns:
+        SolarContext: Solar context with the same timesteps as the irradiance data
+    """
+    if solar is None:
+        return SolarContext(irradiance, latitude=latitude, longitude=longitude)
+    return solar.select(irradiance.index)
+
+
 def get_ac_from_dc(power_dc, nominal_power_ac, *, efficiency_nom=0.96):
     """
     Calculate AC power output of the inverter for a specific DC power.
@@ -98,7 +210,54 @@ def get_ac_from_dc(power_dc, nominal_power_ac, *, efficiency_nom=0.96):
     return efficiency * power_dc
 
 
-def calculate_power_output(irradiance, module, *, tilt, azimuth):
+def calculate_ac_from_dc(power_dc, nominal_power_ac, *, efficiency_nom=0.96):
+    """
+    Calculate the AC power output of the inverter for an array of DC power, in the same way as get_ac_from_dc.
+
+    Parameters:
+        power_dc (Series or ndarray): The DC power of the solar panels
+        nominal_power_ac (float or ndarray): Rated power of the inverter, equal to the rated DC power of the PV system
+
+    Returns:
+        Series or ndarray: The AC power output of the inverter
+    """
+    nominal_power_dc = nominal_power_ac / efficiency_nom
+    zeta = np.asarray(power_dc) / nominal_power_dc
+
+    # Calculate the efficiency, the zero and clipped values are replaced below
+    with np.errstate(divide='ignore', invalid='ignore'):
+        power_ac = (-0.0162 * zeta - (0.0059 / zeta) + 0.9858) * power_dc
+    power_ac = np.where(zeta >= 1, nominal_power_ac, power_ac)
+    power_ac = np.where(zeta == 0, 0, power_ac)
+
+    if isinstance(power_dc, pd.Series):
+        return pd.Series(power_ac, index=power_dc.index)
+    return power_ac
+
+
+def calculate_poa(irradiance, *, tilt, azimuth, row_spacing=None):
+    """
+    Calculate the POA irradiance of a surface for each timestep, with the shading between the rows if the
+    panels are placed in rows.
+
+    Parameters:
+        irradiance (DataFrame or obj): DataFrame with all weather and irradiance data, or a single row of it
+        tilt (float or ndarray): Tilt angle of the panel (degrees)
+        azimuth (float or ndarray): Azimuth angle of the panel (degrees)
+        row_spacing (float or ndarray): Distance between the rows divided by the panel length, see
+            layout.calculate_shaded_poa (optional, panels without rows or with a NaN row spacing are not shaded)
+
+    Returns:
+        obj: Object with the 'poa_global', 'poa_direct', and 'poa_diffuse' for each timestep
+    """
+    if row_spacing is None or np.all(pd.isna(row_spacing)):
+        return pvlib.irradiance.get_total_irradiance(
+            tilt, azimuth, irradiance['solar_zenith'], irradiance['solar_azimuth'],
+            irradiance['DNI'], irradiance['GHI'], irradiance['DHI'])
+    return layout.calculate_shaded_poa(irradiance, tilt=tilt, azimuth=azimuth, row_spacing=row_spacing)
+
+
+def calculate_power_output(irradiance, module, *, tilt, azimuth, solar=None, row_spacing=None):
     """
     Calculate DC and AC power output for each irradiance timestep.
 
@@ -107,6 +266,9 @@ def calculate_power_output(irradiance, module, *, tilt, azimuth):
         module (object): Parameters of the solar panel module
         tilt (float or int): Tilt angle of the panel (degrees)
         azimuth (float or int): Azimuth angle of the panel (degrees)
+        solar (SolarContext): Solar context of the irradiance data, is created if not given
+        row_spacing (float): Distance between the rows divided by the panel length, the direct and sky diffuse
+            irradiance of each timestep is then shaded by the row in front (optional)
 
     Returns:
         obj: DC and AC power output for each irradiance timestep
@@ -114,34 +276,43 @@ def calculate_power_output(irradiance, module, *, tilt, azimuth):
     # Define some variables
     wind = irradiance.wind
     temp_air = irradiance.temp
-    solar_zenith = irradiance.solar_zenith
-    solar_azimuth = irradiance.solar_azimuth
-    solar_apparent_zenith = irradiance.solar_apparent_zenith
-    dni = irradiance.DNI
-    ghi = irradiance.GHI
-    dhi = irradiance.DHI
 
     # Get the POA for this specific facade
-    poa = pvlib.irradiance.get_total_irradiance(tilt, azimuth, solar_zenith, solar_azimuth, dni, ghi, dhi)
+    poa = calculate_poa(irradiance, tilt=tilt, azimuth=azimuth, row_spacing=row_spacing)
 
-    # Calculate the temperature of the cell
-    temp_cell = pvlib.temperature.sapm_cell(poa.poa_global, temp_air, wind, module.A, module.B, module.DTC)
+    # Get the absolute airmass and calculate the Angle of Incidence
+    solar = get_solar_context(irradiance, solar)
+    aoi = solar.calculate_aoi(tilt, azimuth)
+    return calculate_sapm_power(poa, temp_air, wind, solar.absolute_airmass, aoi, module)
 
-    # Calculate the relative and absolute airmass
-    relative_airmass = pvlib.atmosphere.get_relative_airmass(solar_apparent_zenith)
-    absolute_airmass = pvlib.atmosphere.get_absolute_airmass(relative_airmass)
 
-    # Calculate the Angle of Incidence
-    aoi = pvlib.irradiance.aoi(tilt, azimuth, solar_zenith, solar_azimuth)
+def calculate_sapm_power(poa, temp_air, wind, absolute_airmass, aoi, module):
+    """
+    Calculate the DC power of a module with the SAPM and the AC power of its inverter from the POA irradiance.
+
+    All arguments can be arrays, for example the timesteps of a single module or the modules of a single timestep.
+
+    Parameters:
+        poa (obj): Object with the 'poa_global', 'poa_direct', and 'poa_diffuse', see calculate_poa
+        temp_air (float or Series): Air temperature (C)
+        wind (float or Series): Wind speed (m/s)
+        absolute_airmass (float or Series): Absolute airmass
+        aoi (float or Series): Angle of incidence (degrees)
+        module (object): Parameters of the solar panel module
+
+    Returns:
+        obj: DC and AC power output
+    """
+    # Calculate the temperature of the cell
+    temp_cell = pvlib.temperature.sapm_cell(poa['poa_global'], temp_air, wind, module['A'], module['B'], module['DTC'])
 
     # Calculate the effective irradiance
-    effective_irradiance = pvlib.pvsystem.sapm_effective_irradiance(poa.poa_direct, poa.poa_diffuse, absolute_airmass, aoi, module)
+    effective_irradiance = pvlib.pvsystem.sapm_effective_irradiance(
+        poa['poa_direct'], poa['poa_diffuse'], absolute_airmass, aoi, module)
 
     # Calculate the performance of the cell
-    performance = pvlib.pvsystem.sapm(effective_irradiance, temp_cell, module)
-
-    # Calculate the total and relative annual yield
+    power_dc = pvlib.pvsystem.sapm(effective_irradiance, temp_cell, module)['p_mp']
     return {
-        'dc': performance.p_mp,
-        'ac': performance.p_mp.apply(get_ac_from_dc, args=(module.Wp,)),
+        'dc': power_dc,
+        'ac': calculate_ac_from_dc(power_dc, module['Wp']),
     }
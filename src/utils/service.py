@@ -0,0 +1,251 @@
+import functools
+import json
+import math
+import traceback
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from utils import knmi, pv
+from utils import modules as module_library
+
+
+class ValidationError(Exception):
+    """
+    Error in the parameters of a query, which is answered with the HTTP status 400.
+    """
+
+
+class YieldService:
+    """
+    Answers yield queries for any orientation, module, and area from weather data that is kept in memory.
+
+    The power output of a single panel is cached for the most recently used orientations and modules,
+    the installation area only changes the number of panels.
+
+    Parameters:
+        irradiance (DataFrame): DataFrame with all weather and irradiance data
+        solar (SolarContext): Solar context of the irradiance data
+        modules (DataFrame): Module parameters with a column per module
+        cache_size (int): Number of orientation and module combinations that are cached
+    """
+
+    def __init__(self, irradiance, solar, modules, *, cache_size=256):
+        self.irradiance = irradiance
+        self.solar = solar
+        self.modules = modules
+        self._calculate_panel_power = functools.lru_cache(maxsize=cache_size)(self._calculate_panel_power_uncached)
+
+        # Calculate the quantities that are shared by all orientations before the first query
+        self.solar.absolute_airmass
+        self.solar.sun_vector
+
+    def _calculate_panel_power_uncached(self, tilt, azimuth, module):
+        """
+        Calculate the DC and AC power of a single panel, the results are read-only because they are shared.
+        """
+        power_info = pv.calculate_power_output(
+            self.irradiance, self.modules[module], tilt=tilt, azimuth=azimuth, solar=self.solar)
+        power = {output: np.nan_to_num(power_info[output].to_numpy(dtype=float)) for output in ('dc', 'ac')}
+        for values in power.values():
+            values.flags.writeable = False
+        return power
+
+    def calculate_yield(self, *, tilt, azimuth, module, area, hourly=False):
+        """
+        Calculate the annual yield, and optionally the hourly power output, of a PV system.
+
+        Parameters:
+            tilt (float or int): Tilt angle of the panels (degrees)
+            azimuth (float or int): Azimuth angle of the panels (degrees)
+            module (str): Name of the module
+            area (float or int): Area that can be covered with panels (m2)
+            hourly (bool): Whether the power output of each timestep should be included
+
+        Returns:
+            obj: Object with the query, the 'num_panels', 'capacity' (kWp), 'annual_yield_dc' and 'annual_yield_ac'
+                (kWh), and if hourly is set the 'hourly' 'datetime', 'dc', and 'ac' (W) of each daytime timestep
+        """
+        if module not in self.modules.columns:
+            raise ValidationError(f'Unknown module: {module}')
+        if not all(math.isfinite(value) for value in (tilt, azimuth, area)):
+            raise ValidationError('The tilt, azimuth, and area should be finite numbers')
+        if not 0 <= tilt <= 180 or area < 0:
+            raise ValidationError(
+                'The tilt should be between 0 and 180 degrees and the area can not be negative')
+
+        num_panels = math.floor(area / self.modules[module].Area)
+        power = self._calculate_panel_power(float(tilt), float(azimuth % 360), module)
+        result = {
+            'tilt': tilt,
+            'azimuth': azimuth,
+            'module': module,
+            'area': area,
+            'num_panels': num_panels,
+            'capacity': num_panels * float(self.modules[module].Wp) / 1000,
+            'annual_yield_dc': num_panels * float(power['dc'].sum()) / 1000,
+            'annual_yield_ac': num_panels * float(power['ac'].sum()) / 1000,
+        }
+        if hourly:
+            result['hourly'] = {
+                'datetime': self.irradiance.index.strftime('%Y-%m-%dT%H:%M:%SZ').tolist(),
+                'dc': (num_panels * power['dc']).tolist(),
+                'ac': (num_panels * power['ac']).tolist(),
+            }
+        return result
+
+    def get_status(self):
+        """
+        Get the number of cached combinations and the cache hits and misses.
+
+        Returns:
+            obj: Object with the 'timesteps', 'modules', 'cached', 'hits', and 'misses'
+        """
+        cache_info = self._calculate_panel_power.cache_info()
+        return {
+            'timesteps': len(self.irradiance),
+            'modules': len(self.modules.columns),
+            'cached': cache_info.currsize,
+            'hits': cache_info.hits,
+            'misses': cache_info.misses,
+        }
+
+
+def load_service(module_source='../input/Module parameters.xlsx', *, cache_size=256):
+    """
+    Load the KNMI weather data, its solar context, and the module library, and create the yield service.
+
+    Parameters:
+        module_source (str): Path of an .xlsx or .csv file, or 'SandiaMod' or 'CECMod'
+        cache_size (int): Number of orientation and module combinations that are cached
+
+    Returns:
+        YieldService: The yield service
+    """
+    irradiance, solar = knmi.get_irradiance_with_solar_context()
+    modules = module_library.load_modules(module_source)
+    return YieldService(irradiance, solar, modules, cache_size=cache_size)
+
+
+def _parse_yield_query(service, parameters):
+    """
+    Calculate the yield for the parameters of a '/yield' query.
+    """
+    missing_parameters = [name for name in ('tilt', 'azimuth', 'module', 'area') if name not in parameters]
+    if missing_parameters:
+        raise ValidationError(f'Missing parameters: {", ".join(missing_parameters)}')
+
+    try:
+        tilt, azimuth, area = (float(parameters[name]) for name in ('tilt', 'azimuth', 'area'))
+    except ValueError:
+        raise ValidationError('The tilt, azimuth, and area should be numbers')
+
+    hourly = parameters.get('hourly', 'false').lower() in ('1', 'true', 'yes')
+    return service.calculate_yield(tilt=tilt, azimuth=azimuth, module=parameters['module'], area=area, hourly=hourly)
+
+
+ROUTES = {
+    '/yield': _parse_yield_query,
+    '/modules': lambda service, parameters: service.modules.columns.tolist(),
+    '/status': lambda service, parameters: service.get_status(),
+}
+
+
+def handle_request(service, path):
+    """
+    Answer a request to the yield service.
+
+    Parameters:
+        service (YieldService): The yield service
+        path (str): Path of the request with the query string, for example '/yield?tilt=30&azimuth=180&...'
+
+    Returns:
+        int: The HTTP status code
+        obj: The body of the response
+    """
+    url = urllib.parse.urlsplit(path)
+    if url.path not in ROUTES:
+        return 404, {'error': f'Unknown path: {url.path}'}
+
+    # Only invalid parameters are the fault of the client, any other error is an error of the service
+    parameters = {name: values[-1] for name, values in urllib.parse.parse_qs(url.query).items()}
+    try:
+        return 200, ROUTES[url.path](service, parameters)
+    except ValidationError as error:
+        return 400, {'error': str(error)}
+    except Exception:
+        traceback.print_exc()
+        return 500, {'error': 'The request could not be answered because of an internal error'}
+
+
+def encode_response(status, body):
+    """
+    Encode the body of a response as strict JSON, a body with a NaN or infinite number is an error.
+
+    Parameters:
+        status (int): The HTTP status code
+        body (obj): The body of the response
+
+    Returns:
+        int: The HTTP status code
+        bytes: The JSON encoded body
+    """
+    try:
+        return status, json.dumps(body, allow_nan=False).encode()
+    except ValueError:
+        return 500, json.dumps({'error': 'The response contains a number that is not finite'}).encode()
+
+
+def create_server(service, *, host='127.0.0.1', port=8765):
+    """
+    Create an HTTP server for the yield service, each request is handled in its own thread.
+
+    Parameters:
+        service (YieldService): The yield service
+        host (str): Host name or address the server listens on
+        port (int): Port the server listens on, 0 picks a free port
+
+    Returns:
+        ThreadingHTTPServer: The server, call serve_forever to start it
+    """
+    class RequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, content = encode_response(*handle_request(service, self.path))
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    return server
+
+
+class Client:
+    """
+    Sends requests to the yield service in the same process, without a server, for example in tests.
+
+    Parameters:
+        service (YieldService): The yield service
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    def get(self, path, **parameters):
+        """
+        Send a request to the yield service.
+
+        Parameters:
+            path (str): Path of the request, for example '/yield'
+            parameters: Query parameters of the request
+
+        Returns:
+            int: The HTTP status code
+            obj: The body of the response, as it would be received from the server
+        """
+        query = urllib.parse.urlencode(parameters)
+        status, content = encode_response(*handle_request(self.service, f'{path}?{query}' if query else path))
+        return status, json.loads(content)
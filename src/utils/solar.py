@@ -0,0 +1,112 @@
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+import pvlib
+
+
+class SolarContext:
+    """
+    Quantities derived from the solar position of a weather dataset, each calculated once when first used.
+
+    Parameters:
+        irradiance (DataFrame): DataFrame with the solar position columns from pv.get_irradiance
+        latitude (float): Latitude, only required for the clear sky irradiance
+        longitude (float): Longitude, only required for the clear sky irradiance
+    """
+
+    def __init__(self, irradiance, *, latitude=None, longitude=None):
+        self.irradiance = irradiance
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @property
+    def index(self):
+        return self.irradiance.index
+
+    @cached_property
+    def relative_airmass(self):
+        return pvlib.atmosphere.get_relative_airmass(self.irradiance.solar_apparent_zenith)
+
+    @cached_property
+    def absolute_airmass(self):
+        return pvlib.atmosphere.get_absolute_airmass(self.relative_airmass)
+
+    @cached_property
+    def extra_radiation(self):
+        """
+        Extraterrestrial irradiance with the Spencer method and a solar constant of 1370, as DISC and DIRINT use it.
+        """
+        return pvlib.irradiance.get_extra_radiation(self.index, solar_constant=1370, method='spencer')
+
+    @cached_property
+    def kasten_airmass(self):
+        """
+        Absolute airmass at sea level with the Kasten (1966) model of the true zenith, as DISC and DIRINT use it.
+        """
+        relative_airmass = pvlib.atmosphere.get_relative_airmass(self.irradiance.solar_zenith, model='kasten1966')
+        return pvlib.atmosphere.get_absolute_airmass(relative_airmass)
+
+    @cached_property
+    def linke_turbidity(self):
+        if self.latitude is None or self.longitude is None:
+            raise Exception('The latitude and longitude are required for the Linke turbidity')
+        return pvlib.clearsky.lookup_linke_turbidity(self.index, self.latitude, self.longitude)
+
+    @cached_property
+    def clearsky(self):
+        return pvlib.clearsky.ineichen(
+            self.irradiance.solar_apparent_zenith, self.absolute_airmass, self.linke_turbidity, perez_enhancement=True)
+
+    @cached_property
+    def cos_zenith(self):
+        return np.cos(np.radians(self.irradiance.solar_zenith))
+
+    @cached_property
+    def sun_vector(self):
+        """
+        Unit vector pointing to the sun, with the 'east', 'north', and 'up' components as columns.
+        """
+        zenith = np.radians(self.irradiance.solar_zenith)
+        azimuth = np.radians(self.irradiance.solar_azimuth)
+        return pd.DataFrame({
+            'east': np.sin(zenith) * np.sin(azimuth),
+            'north': np.sin(zenith) * np.cos(azimuth),
+            'up': self.cos_zenith,
+        })
+
+    def calculate_aoi(self, tilt, azimuth):
+        """
+        Calculate the angle of incidence on a surface from the sun vector.
+
+        Parameters:
+            tilt (float or int): Tilt angle of the surface (degrees)
+            azimuth (float or int): Azimuth angle of the surface (degrees)
+
+        Returns:
+            Series: Angle of incidence for each timestep (degrees)
+        """
+        tilt = np.radians(tilt)
+        azimuth = np.radians(azimuth)
+        projection = self.sun_vector.to_numpy() @ np.array([
+            np.sin(tilt) * np.sin(azimuth), np.sin(tilt) * np.cos(azimuth), np.cos(tilt)])
+        return pd.Series(np.degrees(np.arccos(np.clip(projection, -1, 1))), index=self.index)
+
+    def select(self, index):
+        """
+        Get the solar context for a part of the dataset, keeping the quantities that were already calculated.
+
+        Parameters:
+            index (DatetimeIndex): Timesteps that should be selected
+
+        Returns:
+            SolarContext: Solar context for the selected timesteps
+        """
+        if index.equals(self.index):
+            return self
+
+        selection = SolarContext(self.irradiance.loc[index], latitude=self.latitude, longitude=self.longitude)
+        for name, value in vars(self).items():
+            if isinstance(value, (pd.Series, pd.DataFrame)) and name != 'irradiance':
+                vars(selection)[name] = value.loc[index]
+        return selection
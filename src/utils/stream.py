@@ -0,0 +1,202 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pvlib
+
+from utils import decomposition, pv
+
+
+def read_knmi_rows(lines):
+    """
+    Parse the lines of a raw KNMI hourly data file one at a time.
+
+    Parameters:
+        lines (iterable): Lines of the raw KNMI file, for example an open file or a live feed
+
+    Yields:
+        obj: Object with the 'datetime' (middle of the hour, UTC), 'wind' (m/s), 'temp' (C), and 'GHI' (W/m2)
+    """
+    for line in lines:
+        # Skip the comments, the header, and empty lines
+        values = [value.strip() for value in line.split(',')]
+        if len(values) != 6 or not values[1].isdigit():
+            continue
+
+        _, date, hour, wind, temp, ghi = [float(value) if value else math.nan for value in values]
+        timestamp = pd.Timestamp(str(int(date)), tz='UTC') + pd.Timedelta(hours=hour - 1, minutes=30)
+        yield {
+            'datetime': timestamp,
+            'wind': wind / 10,  # 0.1m/s to m/s
+            'temp': temp / 10,  # 0.1C to C
+            'GHI': ghi * 100 ** 2 / 60 / 60,  # J/cm2 to W/m2
+        }
+
+
+def _decompose_irradiance(window, position, *, provisional=False):
+    """
+    Calculate the DNI and DHI of a single row with the DIRINDEX model.
+
+    Parameters:
+        window (list): Consecutive rows around the row that should be calculated
+        position (int): Position of the row that should be calculated in the window
+        provisional (bool): Whether the next row is still missing, so the row will be calculated again
+
+    Returns:
+        obj: The row with the 'DNI', 'DHI', and 'provisional' added
+    """
+    dni = decomposition.dirindex(
+        [row['GHI'] for row in window], [row['clearsky_ghi'] for row in window],
+        [row['clearsky_dni'] for row in window], [row['solar_zenith'] for row in window],
+        pd.DatetimeIndex([row['datetime'] for row in window])).iloc[position]
+
+    row = dict(window[position])
+    row['DNI'] = dni
+    row['DHI'] = row['GHI'] - dni * math.cos(math.radians(row['solar_zenith']))
+    row['provisional'] = provisional
+    return row
+
+
+def calculate_irradiance(observations, *, latitude, longitude):
+    """
+    Calculate the solar position, DNI, and DHI for a stream of weather observations.
+
+    DIRINDEX uses the clearness index of the previous and next timestep. Each row is yielded at once
+    as a provisional row, calculated with only the previous timestep, and yielded again when the next
+    daytime observation has arrived (or when the stream ends). The final rows give the same result as
+    calculating the whole dataset at once, and the last row of the day does not wait for the next morning.
+
+    Parameters:
+        observations (iterable): Objects with the 'datetime', 'wind', 'temp', and 'GHI'
+        latitude (float): Latitude
+        longitude (float): Longitude
+
+    Yields:
+        obj: Observation with the solar position ('solar_' keys), 'DNI', 'DHI', and whether it is 'provisional'
+    """
+    linke_turbidities = {}
+    window = []
+    for observation in observations:
+        time = pd.DatetimeIndex([observation['datetime']])
+        solar_position = pvlib.solarposition.ephemeris(
+            time, latitude, longitude, temperature=observation['temp']).iloc[0]
+
+        # Skip all timestamps where the solar elevation is less than 4
+        if solar_position.elevation <= 4:
+            continue
+
+        # The Linke turbidity only changes per day, so it is looked up once per day
+        date = time[0].date()
+        if date not in linke_turbidities:
+            linke_turbidities[date] = pvlib.clearsky.lookup_linke_turbidity(time, latitude, longitude).iloc[0]
+
+        relative_airmass = pvlib.atmosphere.get_relative_airmass(solar_position.apparent_zenith)
+        absolute_airmass = pvlib.atmosphere.get_absolute_airmass(relative_airmass)
+        clearsky = pvlib.clearsky.ineichen(
+            solar_position.apparent_zenith, absolute_airmass, linke_turbidities[date], perez_enhancement=True)
+
+        row = dict(observation)
+        for column_name, value in solar_position.items():
+            row[column_name if column_name.startswith('solar') else f'solar_{column_name}'] = value
+        row['clearsky_ghi'] = clearsky['ghi']
+        row['clearsky_dni'] = clearsky['dni']
+
+        # Keep the last three rows, the middle one now has both neighbours and replaces its provisional row
+        window = (window + [row])[-3:]
+        if len(window) >= 2:
+            yield _decompose_irradiance(window, len(window) - 2)
+        yield _decompose_irradiance(window, len(window) - 1, provisional=True)
+
+    # The last row does not have a next timestep, so its provisional row is final
+    if window:
+        yield _decompose_irradiance(window, len(window) - 1)
+
+
+def accumulate_yield(irradiance_rows, facades, best_modules, modules):
+    """
+    Keep a running year-to-date total of the DC and AC yield of each facade for a stream of irradiance rows.
+
+    Each row is calculated for all facades at once, so the work per row does not depend on
+    the number of rows that have already been processed. Rows with a missing value have no power
+    output, like in the sum of the whole dataset, and are counted as skipped. A provisional row is
+    replaced by the next row with the same timestep, and the totals start at zero on January 1.
+
+    Parameters:
+        irradiance_rows (iterable): Objects with the weather, solar position, DNI, DHI, and 'provisional'
+        facades (DataFrame): Table with a row per facade
+        best_modules (DataFrame): Table with the module and number of panels per facade
+        modules (DataFrame): Module parameters with a column per module
+
+    Yields:
+        obj: Object with the 'datetime' of the last row and whether it is 'provisional', the 'yield_dc' and
+            'yield_ac' (in kWh) per facade, and the number of 'skipped' rows without a power output for one or
+            more facades
+    """
+    tilt = facades.tilt.loc[best_modules.index].to_numpy(dtype=float)
+    azimuth = facades.azimuth.loc[best_modules.index].to_numpy(dtype=float)
+    row_spacing = facades.row_spacing.loc[best_modules.index].to_numpy(dtype=float)
+    num_panels = best_modules.num_panels.to_numpy(dtype=float)
+
+    # Combine the parameters of the best module of each facade into one array per parameter
+    module_parameters = modules[best_modules.module].T.apply(pd.to_numeric, errors='coerce')
+    module = {name: module_parameters[name].to_numpy() for name in module_parameters.columns}
+
+    year = None
+    provisional = None
+    for row in irradiance_rows:
+        if row['datetime'].year != year:
+            year = row['datetime'].year
+            totals = {'dc': np.zeros(len(best_modules)), 'ac': np.zeros(len(best_modules)), 'skipped': 0}
+
+        # Remove the provisional row that is replaced by this row
+        if provisional is not None and provisional['datetime'] == row['datetime']:
+            for name in totals:
+                totals[name] -= provisional[name]
+        provisional = None
+
+        poa = pv.calculate_poa(row, tilt=tilt, azimuth=azimuth, row_spacing=row_spacing)
+        relative_airmass = pvlib.atmosphere.get_relative_airmass(row['solar_apparent_zenith'])
+        absolute_airmass = pvlib.atmosphere.get_absolute_airmass(relative_airmass)
+        aoi = pvlib.irradiance.aoi(tilt, azimuth, row['solar_zenith'], row['solar_azimuth'])
+        power = pv.calculate_sapm_power(poa, row['temp'], row['wind'], absolute_airmass, aoi, module)
+
+        # Each row is one hour, so the power in W equals the energy in Wh, a missing GHI, temperature, or
+        # wind speed results in a missing power output
+        contribution = {
+            'dc': num_panels * np.nan_to_num(power['dc']) / 1000,
+            'ac': num_panels * np.nan_to_num(power['ac']) / 1000,
+            'skipped': int(np.isnan(power['dc']).any()),
+        }
+        for name in totals:
+            totals[name] += contribution[name]
+        if row.get('provisional', False):
+            provisional = {'datetime': row['datetime'], **contribution}
+
+        yield {
+            'datetime': row['datetime'],
+            'provisional': row.get('provisional', False),
+            'yield_dc': pd.Series(totals['dc'], index=best_modules.index),
+            'yield_ac': pd.Series(totals['ac'], index=best_modules.index),
+            'skipped': totals['skipped'],
+        }
+
+
+def stream_yield(lines, facades, best_modules, modules, *, latitude, longitude):
+    """
+    Calculate the running year-to-date yield of each facade from raw KNMI lines.
+
+    Parameters:
+        lines (iterable): Lines of the raw KNMI file, for example an open file or a live feed
+        facades (DataFrame): Table with a row per facade
+        best_modules (DataFrame): Table with the module and number of panels per facade
+        modules (DataFrame): Module parameters with a column per module
+        latitude (float): Latitude
+        longitude (float): Longitude
+
+    Returns:
+        generator: Generator that yields the running totals after each daytime row, and again when a provisional
+            row is replaced, see accumulate_yield
+    """
+    observations = read_knmi_rows(lines)
+    irradiance_rows = calculate_irradiance(observations, latitude=latitude, longitude=longitude)
+    return accumulate_yield(irradiance_rows, facades, best_modules, modules)